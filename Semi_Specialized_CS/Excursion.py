@@ -10,7 +10,8 @@ from langchain.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
 
 from database import Database
-from utils import list_of_dict_to_str
+from utils import list_of_dict_to_str, ExecutorToolMixin
+from cache import cached_search, invalidates
 
 #TODO: Complete Description of each fields in  tools input
 #TODO: also we can change input of each tools to better understanding from LLM
@@ -21,6 +22,7 @@ class ExcursionsManager:
         self.db = db
         self.llm = llm
         
+    @cached_search('trip_recommendations')
     def search_trip_recommendations(
         self,
         location: Optional[str] = None,
@@ -38,32 +40,33 @@ class ExcursionsManager:
         Returns:
             list[dict]: A list of trip recommendation dictionaries matching the search criteria.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
-
-        query = "SELECT * FROM trip_recommendations WHERE 1=1"
-        params = []
-
-        if location:
-            query += " AND location LIKE ?"
-            params.append(f"%{location}%")
-        if name:
-            query += " AND name LIKE ?"
-            params.append(f"%{name}%")
-        if keywords:
-            keyword_list = keywords.split(",")
-            keyword_conditions = " OR ".join(["keywords LIKE ?" for _ in keyword_list])
-            query += f" AND ({keyword_conditions})"
-            params.extend([f"%{keyword.strip()}%" for keyword in keyword_list])
-
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        column_names = [column[0] for column in cursor.description]
-        results = [dict(zip(column_names, row)) for row in rows]
-
-        return results
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
+
+
+            query = "SELECT * FROM trip_recommendations WHERE 1=1"
+            params = []
+
+            if location:
+                query += " AND location LIKE ?"
+                params.append(f"%{location}%")
+            if name:
+                query += " AND name LIKE ?"
+                params.append(f"%{name}%")
+            if keywords:
+                keyword_list = keywords.split(",")
+                keyword_conditions = " OR ".join(["keywords LIKE ?" for _ in keyword_list])
+                query += f" AND ({keyword_conditions})"
+                params.extend([f"%{keyword.strip()}%" for keyword in keyword_list])
+
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            column_names = [column[0] for column in cursor.description]
+            results = [dict(zip(column_names, row)) for row in rows]
+
+            return results
     
+    @invalidates('trip_recommendations')
     def book_excursion(self, recommendation_id: int) -> str:
         """
         Book a excursion by its recommendation ID.
@@ -74,23 +77,22 @@ class ExcursionsManager:
         Returns:
             str: A message indicating whether the trip recommendation was successfully booked or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute(
-            "UPDATE trip_recommendations SET booked = 1 WHERE id = ?", (recommendation_id,)
-        )
-        connection.commit()
+            cursor.execute(
+                "UPDATE trip_recommendations SET booked = 1 WHERE id = ?", (recommendation_id,)
+            )
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Trip recommendation {recommendation_id} successfully booked."
-        else:
-            connection.close()
-            return f"No trip recommendation found with ID {recommendation_id}."
+            if cursor.rowcount > 0:
+                return f"Trip recommendation {recommendation_id} successfully booked."
+            else:
+                return f"No trip recommendation found with ID {recommendation_id}."
 
 
 
+    @invalidates('trip_recommendations')
     def update_excursion(self, recommendation_id: int, details: str) -> str:
         """
         Update a trip recommendation's details by its ID.
@@ -102,23 +104,22 @@ class ExcursionsManager:
         Returns:
             str: A message indicating whether the trip recommendation was successfully updated or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute(
-            "UPDATE trip_recommendations SET details = ? WHERE id = ?",
-            (details, recommendation_id),
-        )
-        connection.commit()
+            cursor.execute(
+                "UPDATE trip_recommendations SET details = ? WHERE id = ?",
+                (details, recommendation_id),
+            )
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Trip recommendation {recommendation_id} successfully updated."
-        else:
-            connection.close()
-            return f"No trip recommendation found with ID {recommendation_id}."
+            if cursor.rowcount > 0:
+                return f"Trip recommendation {recommendation_id} successfully updated."
+            else:
+                return f"No trip recommendation found with ID {recommendation_id}."
 
 
+    @invalidates('trip_recommendations')
     def cancel_excursion(self, recommendation_id: int) -> str:
         """
         Cancel a trip recommendation by its ID.
@@ -129,20 +130,18 @@ class ExcursionsManager:
         Returns:
             str: A message indicating whether the trip recommendation was successfully cancelled or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute(
-            "UPDATE trip_recommendations SET booked = 0 WHERE id = ?", (recommendation_id,)
-        )
-        connection.commit()
+            cursor.execute(
+                "UPDATE trip_recommendations SET booked = 0 WHERE id = ?", (recommendation_id,)
+            )
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Trip recommendation {recommendation_id} successfully cancelled."
-        else:
-            connection.close()
-            return f"No trip recommendation found with ID {recommendation_id}."
+            if cursor.rowcount > 0:
+                return f"Trip recommendation {recommendation_id} successfully cancelled."
+            else:
+                return f"No trip recommendation found with ID {recommendation_id}."
 
 
         
@@ -162,7 +161,7 @@ class search_trip_recommendations_Input(BaseModel):
     keywords: Optional[str] = Field(description='keywords (Optional[str]): The keywords associated with the trip recommendation. Defaults to None.')
 
 
-class search_trip_recommendations_Tool(BaseTool):
+class search_trip_recommendations_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'search_trip_recommendations_tool'
     description = (
@@ -175,13 +174,16 @@ class search_trip_recommendations_Tool(BaseTool):
             keywords (Optional[str]): The keywords associated with the trip recommendation. Defaults to None.
 
         Returns:
-            list[dict]: A list of trip recommendation dictionaries matching the search criteria.
+            str: The trip recommendations matching the search criteria, one entry per recommendation.
         """
     )
     args_schema: Type[BaseModel] = search_trip_recommendations_Input
     return_direct: bool = False
 
     excursions_manager: ExcursionsManager
+    output_format: str = 'items'
+    output_columns: Optional[List[str]] = None
+    max_rows: Optional[int] = None
 
     def _run(
         self, 
@@ -193,14 +195,19 @@ class search_trip_recommendations_Tool(BaseTool):
         results = self.excursions_manager.search_trip_recommendations(
             location, name, keywords
         )
-        return list_of_dict_to_str(results)
+        return list_of_dict_to_str(
+            results,
+            max_rows=self.max_rows,
+            tabular=self.output_format == 'table',
+            columns=self.output_columns,
+        )
     
 
 class book_excursion_Input(BaseModel):
     recommendation_id: Optional[int] = Field(description='recommendation_id (int): The ID of the trip recommendation to book.')
 
 
-class book_excursion_Tool(BaseTool):
+class book_excursion_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'book_excursion_tool'
     description = (
@@ -235,7 +242,7 @@ class update_excursion_Input(BaseModel):
     details: Optional[str] = Field(description='details (str): The new details of the trip recommendation.')
 
 
-class update_excursion_Tool(BaseTool):
+class update_excursion_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'update_excursion_tool'
     description = (
@@ -271,7 +278,7 @@ class cancel_excursion_Input(BaseModel):
     recommendation_id: Optional[int] = Field(description='recommendation_id (int): The ID of the trip recommendation to cancel.')
 
 
-class cancel_excursion_Tool(BaseTool):
+class cancel_excursion_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'cancel_excursion_tool'
     description = (
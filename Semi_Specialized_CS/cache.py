@@ -0,0 +1,136 @@
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, List
+
+from metrics import record
+
+
+class ResultCache:
+    """A thread-safe TTL + LRU cache for read-only query results.
+
+    Entries are grouped by a tag (usually the table they were read from) so
+    a write can invalidate just the results that depend on it.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, tag: str, key: Hashable, compute: Callable[[], Any]) -> Any:
+        entry_key = (tag, key)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            hit = entry is not None and entry[0] > time.monotonic()
+            if hit:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+            else:
+                self._entries.pop(entry_key, None)
+                self.misses += 1
+                generation = (self._epoch, self._generations.get(tag, 0))
+
+        if hit:
+            record(cache_hits=1)
+            return entry[1]
+        record(cache_misses=1)
+
+        value = compute()
+
+        with self._lock:
+            # Skip storing if a write invalidated the tag while we were computing
+            if (self._epoch, self._generations.get(tag, 0)) == generation:
+                self._entries[entry_key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(entry_key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key in self._entries if key[0] in tags]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'size': len(self._entries),
+            }
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip() or None
+    return value
+
+
+def _key_part(value: Any) -> Hashable:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def cached_search(tag: str) -> Callable:
+    """Serve a manager search method from `self.db.cache`, keyed on its normalized arguments.
+
+    String arguments are stripped (empty strings become None) before both the
+    lookup and the actual query, so equivalent calls share one entry.
+    """
+    def decorator(method: Callable[..., List[Dict]]) -> Callable[..., List[Dict]]:
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs) -> List[Dict]:
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = {
+                name: _normalize(value)
+                for name, value in bound.arguments.items() if name != 'self'
+            }
+            key = (method.__name__,) + tuple(_key_part(value) for value in arguments.values())
+            rows = self.db.cache.get_or_compute(tag, key, lambda: method(self, **arguments))
+            return [dict(row) for row in rows]
+
+        return wrapper
+
+    return decorator
+
+
+def invalidates(*tags: str) -> Callable:
+    """Drop the cached results for `tags` after the decorated write method runs."""
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.db.cache.invalidate(*tags)
+
+        return wrapper
+
+    return decorator
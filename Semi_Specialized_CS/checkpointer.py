@@ -0,0 +1,143 @@
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+class PrunedSqliteSaver(SqliteSaver):
+    """A `SqliteSaver` on a WAL database file with a retention policy.
+
+    Only the newest `keep_last` checkpoints of each `thread_id` are kept, and
+    threads without a checkpoint for `thread_ttl` seconds are dropped. Pruning
+    runs on a background thread every `compact_interval` seconds, through its
+    own connection so it never contends with the saver's connection lock.
+    """
+
+    def __init__(
+        self,
+        conn: sqlite3.Connection,
+        path: str,
+        keep_last: int = 20,
+        thread_ttl: Optional[float] = 7 * 24 * 3600,
+        compact_interval: Optional[float] = 300.0,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(conn, **kwargs)
+        self.path = path
+        self.keep_last = keep_last
+        self.thread_ttl = thread_ttl
+        self.compact_interval = compact_interval
+        self.put_count = 0
+        self.put_seconds = 0.0
+        self._compaction_thread = None
+        self._stop = threading.Event()
+        if compact_interval:
+            self.start_compaction()
+
+    @classmethod
+    def from_path(cls, path: str, **kwargs: Any) -> "PrunedSqliteSaver":
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = cls._connect(path)
+        return cls(conn, path, **kwargs)
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, timeout=30.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    def put(self, *args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        result = super().put(*args, **kwargs)
+        self.put_seconds += time.perf_counter() - start
+        self.put_count += 1
+        return result
+
+    def stats(self) -> Dict[str, float]:
+        """Checkpoint write count and mean latency per graph step."""
+        return {
+            'puts': self.put_count,
+            'mean_put_ms': 1000 * self.put_seconds / self.put_count if self.put_count else 0.0,
+        }
+
+    def prune(self) -> int:
+        """Apply the retention policy now and return the number of deleted checkpoints."""
+        conn = self._connect(self.path)
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'checkpoints'"
+            ).fetchone()
+            if not exists:
+                return 0
+
+            deleted = 0
+            with conn:
+                if self.thread_ttl:
+                    cutoff = (
+                        datetime.now(timezone.utc) - timedelta(seconds=self.thread_ttl)
+                    ).isoformat()
+                    deleted += conn.execute(
+                        """
+                        DELETE FROM checkpoints WHERE thread_id IN (
+                            SELECT thread_id FROM checkpoints
+                            GROUP BY thread_id HAVING MAX(thread_ts) < ?
+                        )
+                        """,
+                        (cutoff,),
+                    ).rowcount
+                if self.keep_last:
+                    deleted += conn.execute(
+                        """
+                        DELETE FROM checkpoints WHERE rowid IN (
+                            SELECT rowid FROM (
+                                SELECT rowid, ROW_NUMBER() OVER (
+                                    PARTITION BY thread_id ORDER BY thread_ts DESC
+                                ) AS position
+                                FROM checkpoints
+                            ) WHERE position > ?
+                        )
+                        """,
+                        (self.keep_last,),
+                    ).rowcount
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            return deleted
+        finally:
+            conn.close()
+
+    def start_compaction(self) -> None:
+        if self._compaction_thread is not None:
+            return
+        self._compaction_thread = threading.Thread(
+            target=self._compaction_loop, name='checkpoint-compaction', daemon=True
+        )
+        self._compaction_thread.start()
+
+    def stop_compaction(self) -> None:
+        self._stop.set()
+
+    def _compaction_loop(self) -> None:
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.prune()
+            except sqlite3.Error:
+                # Retried on the next interval
+                pass
+
+
+_savers: Dict[str, PrunedSqliteSaver] = {}
+_savers_lock = threading.Lock()
+
+
+def get_checkpointer(path: str, **kwargs: Any) -> PrunedSqliteSaver:
+    """The process-wide saver for `path`, so graphs on the same file share one
+    connection and one compaction thread. `kwargs` only apply on first use."""
+    key = os.path.abspath(path)
+    with _savers_lock:
+        if key not in _savers:
+            _savers[key] = PrunedSqliteSaver.from_path(path, **kwargs)
+        return _savers[key]
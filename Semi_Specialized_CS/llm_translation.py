@@ -1,18 +1,381 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Type, Union
+
 from langchain_core.language_models import BaseChatModel
-from typing import List, Dict, Type, Optional, Union
 
+from utils import repair_json, run_in_tool_executor
 
 
-def translate_to_english(text: str, llm: BaseChatModel) -> str:
-    return llm.invoke(
-        "Translate the following text to English without adding any notes:\n\n" + text
-    ).content
+ENGLISH = 'en'
+PERSIAN = 'fa'
+TRANSLATION_MEMORY_PATH = "storage/translations/translations.sqlite"
+
 
+def _english_prompt(text: str) -> str:
+    return "Translate the following text to English without adding any notes:\n\n" + text
 
-def translate_to_persian(text: Optional[Union[list, str, dict]], llm: BaseChatModel) -> str:
-    return llm.invoke(
+
+def _persian_prompt(text: Optional[Union[list, str, dict]]) -> str:
+    return (
         "Translate the following text to Persian without adding any notes.\n" +
         "Do not convert dates to Jalali calander and keep times in GMT.\n" +
         "Do not say anything before or after the translated text.\n" +
         f"Here is the text to translate: {text}"
-    ).content
+    )
+
+
+def _batch_prompt(texts: List[str], target: str) -> str:
+    language = 'English' if target == ENGLISH else 'Persian'
+    rules = "" if target == ENGLISH else "Do not convert dates to Jalali calander and keep times in GMT.\n"
+    return (
+        f"Translate each string in the following JSON list to {language} without adding any notes.\n" +
+        rules +
+        "Return only a JSON list of the translations, with the same length and in the same order.\n" +
+        json.dumps(texts, ensure_ascii=False)
+    )
+
+
+_PROMPTS: Dict[str, Callable[[Any], str]] = {ENGLISH: _english_prompt, PERSIAN: _persian_prompt}
+
+
+def normalize_text(text: Any) -> str:
+    """Key under which a source text is remembered: NFC, stripped, whitespace collapsed."""
+    if not isinstance(text, str):
+        text = str(text)
+    return ' '.join(unicodedata.normalize('NFC', text).split())
+
+
+# Arabic, Arabic Supplement, Arabic Extended-A and the presentation forms used for Persian
+_PERSIAN_RANGES = ((0x0600, 0x06FF), (0x0750, 0x077F), (0x08A0, 0x08FF), (0xFB50, 0xFDFF), (0xFE70, 0xFEFF))
+
+
+def _is_persian_letter(char: str) -> bool:
+    code = ord(char)
+    return any(start <= code <= end for start, end in _PERSIAN_RANGES)
+
+
+def detect_language(text: str, threshold: float = 0.6) -> Optional[str]:
+    """
+    Guess whether `text` is Persian or English from the scripts of its letters.
+
+    Digits, punctuation and whitespace are ignored, so flight numbers or dates
+    inside a sentence do not affect the result.
+
+    Args:
+        text (str): The text to inspect.
+        threshold (float): Share of letters that must be in one script.
+
+    Returns:
+        Optional[str]: `PERSIAN`, `ENGLISH`, or None if the text has no letters or mixes scripts.
+    """
+    letters = persian = latin = 0
+    for char in text:
+        if not char.isalpha():
+            continue
+        letters += 1
+        if _is_persian_letter(char):
+            persian += 1
+        elif char.isascii() or 'LATIN' in unicodedata.name(char, ''):
+            latin += 1
+    if not letters:
+        return None
+    if persian / letters >= threshold:
+        return PERSIAN
+    if latin / letters >= threshold:
+        return ENGLISH
+    return None
+
+
+def _already_in(text: Any, target: str) -> bool:
+    if isinstance(text, str) and detect_language(text) == target:
+        _count(skipped_same_language=1)
+        return True
+    return False
+
+
+class TranslationMemory:
+    """Remembers translations by (target language, normalized source text).
+
+    Lookups go to an in-process LRU first and then to a SQLite file, so
+    repeated questions skip the LLM round trip across restarts as well. The
+    file is pruned every `prune_every` writes: rows older than `ttl` go first,
+    then the oldest rows beyond `max_rows`.
+
+    Args:
+        path (Optional[str]): SQLite file of the persistent memory. None keeps
+            translations in the in-process cache only.
+        hot_size (int): Number of translations kept in the in-process cache.
+        max_rows (Optional[int]): Most translations kept in the file, None for no cap.
+        ttl (Optional[float]): Seconds a translation is kept in the file, None to keep it forever.
+        prune_every (int): Number of writes to the file between two prunes.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = TRANSLATION_MEMORY_PATH,
+        hot_size: int = 1024,
+        max_rows: Optional[int] = 50_000,
+        ttl: Optional[float] = 30 * 24 * 3600,
+        prune_every: int = 256,
+    ) -> None:
+        self.path = path
+        self.hot_size = hot_size
+        self.max_rows = max_rows
+        self.ttl = ttl
+        self.prune_every = prune_every
+        self._lock = threading.Lock()
+        self._hot = OrderedDict()
+        self._conn = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS translations (
+                    target TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (target, source)
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_created ON translations (created)")
+            conn.commit()
+            self._conn = conn
+            self._prune(conn)
+        return self._conn
+
+    def _prune(self, conn: sqlite3.Connection) -> int:
+        deleted = 0
+        with conn:
+            if self.ttl:
+                deleted += conn.execute(
+                    "DELETE FROM translations WHERE created < ?", (time.time() - self.ttl,)
+                ).rowcount
+            if self.max_rows:
+                deleted += conn.execute(
+                    """
+                    DELETE FROM translations WHERE created <= (
+                        SELECT created FROM translations ORDER BY created DESC LIMIT 1 OFFSET ?
+                    )
+                    """,
+                    (self.max_rows,),
+                ).rowcount
+        return deleted
+
+    def prune(self) -> int:
+        """Apply the row cap and TTL to the file now and return the number of deleted translations."""
+        with self._lock:
+            conn = self._connection()
+            return self._prune(conn) if conn is not None else 0
+
+    def _remember(self, key: tuple, translation: str) -> None:
+        self._hot[key] = translation
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+    def get(self, target: str, text: Any) -> Optional[str]:
+        key = (target, normalize_text(text))
+        with self._lock:
+            translation = self._hot.get(key)
+            conn = self._connection() if translation is None else None
+            if conn is not None:
+                row = conn.execute(
+                    "SELECT translation FROM translations WHERE target = ? AND source = ?", key
+                ).fetchone()
+                if row is not None:
+                    translation = row[0]
+            if translation is None:
+                self.misses += 1
+                return None
+            self._remember(key, translation)
+            self.hits += 1
+            return translation
+
+    def put(self, target: str, text: Any, translation: str, persist: bool = True) -> None:
+        """Remember `translation`; with `persist=False` it stays in the in-process cache only."""
+        if not translation:
+            return
+        key = (target, normalize_text(text))
+        with self._lock:
+            self._remember(key, translation)
+            conn = self._connection() if persist else None
+            if conn is not None:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                        key + (translation, time.time()),
+                    )
+                self._writes += 1
+                if self._writes % self.prune_every == 0:
+                    self._prune(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'hot_size': len(self._hot)}
+
+
+_memory: Optional[TranslationMemory] = None
+_memory_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'llm_calls': 0, 'batched_texts': 0, 'skipped_same_language': 0}
+
+
+def get_translation_memory() -> TranslationMemory:
+    """Return the shared `TranslationMemory`, opening the default file on first use."""
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = TranslationMemory()
+        return _memory
+
+
+def set_translation_memory(memory: TranslationMemory) -> None:
+    global _memory
+    with _memory_lock:
+        _memory = memory
+
+
+def _count(**counts: int) -> None:
+    with _stats_lock:
+        for key, value in counts.items():
+            _stats[key] = _stats.get(key, 0) + value
+
+
+def translation_stats() -> Dict[str, int]:
+    """LLM translation calls made, and calls saved by language detection and the translation memory."""
+    with _stats_lock:
+        stats = dict(_stats)
+    memory = get_translation_memory().stats()
+    stats['saved_by_memory'] = memory['hits']
+    return stats
+
+
+def _translate(text: Any, llm: BaseChatModel, target: str, persist: bool = True) -> str:
+    if _already_in(text, target):
+        return text
+    memory = get_translation_memory()
+    translation = memory.get(target, text)
+    if translation is None:
+        _count(llm_calls=1)
+        translation = llm.invoke(_PROMPTS[target](text)).content
+        memory.put(target, text, translation, persist=persist)
+    return translation
+
+
+async def _atranslate(text: Any, llm: BaseChatModel, target: str, persist: bool = True) -> str:
+    if _already_in(text, target):
+        return text
+    memory = get_translation_memory()
+    # The memory reads and writes SQLite, so keep it off the event loop
+    translation = await run_in_tool_executor(memory.get, target, text)
+    if translation is None:
+        _count(llm_calls=1)
+        translation = (await llm.ainvoke(_PROMPTS[target](text))).content
+        await run_in_tool_executor(memory.put, target, text, translation, persist=persist)
+    return translation
+
+
+def translate_to_english(text: str, llm: BaseChatModel) -> str:
+    return _translate(text, llm, ENGLISH)
+
+
+def translate_to_persian(
+    text: Optional[Union[list, str, dict]], llm: BaseChatModel, persist: bool = True
+) -> str:
+    """Translate `text` to Persian. Pass `persist=False` for one-off text such as a final
+    answer, so it is only kept in the in-process cache and not written to the file."""
+    return _translate(text, llm, PERSIAN, persist)
+
+
+async def atranslate_to_english(text: str, llm: BaseChatModel) -> str:
+    return await _atranslate(text, llm, ENGLISH)
+
+
+async def atranslate_to_persian(
+    text: Optional[Union[list, str, dict]], llm: BaseChatModel, persist: bool = True
+) -> str:
+    return await _atranslate(text, llm, PERSIAN, persist)
+
+
+def _parse_batch(content: str, expected: int) -> Optional[List[str]]:
+    try:
+        translations = repair_json(content)
+    except ValueError:
+        return None
+    if not isinstance(translations, list) or len(translations) != expected:
+        return None
+    return [str(translation) for translation in translations]
+
+
+def translate_many(texts: List[str], llm: BaseChatModel, target: str = PERSIAN) -> List[str]:
+    """
+    Translate several strings with at most one LLM call.
+
+    Strings already in the target language are returned as they are,
+    remembered translations are reused, and duplicates are translated once. If
+    the model's reply is not a JSON list of the right length, the missing
+    strings are translated one by one instead.
+
+    Args:
+        texts (List[str]): The strings to translate.
+        llm (BaseChatModel): The model to translate with.
+        target (str): `PERSIAN` or `ENGLISH`.
+
+    Returns:
+        List[str]: The translations, in the order of `texts`.
+    """
+    memory = get_translation_memory()
+    # Normalized text -> translation, or None for text already in the target language
+    translations = {}
+    # Normalized text -> the original text sent to the model, line breaks included
+    missing = {}
+    for text in texts:
+        key = normalize_text(text)
+        if key in translations or key in missing:
+            continue
+        if _already_in(text, target):
+            translations[key] = None
+            continue
+        cached = memory.get(target, key)
+        if cached is None:
+            missing[key] = text
+        else:
+            translations[key] = cached
+
+    if len(missing) == 1:
+        (key, text), = missing.items()
+        translations[key] = _translate(text, llm, target)
+    elif missing:
+        originals = list(missing.values())
+        _count(llm_calls=1, batched_texts=len(originals))
+        batch = _parse_batch(llm.invoke(_batch_prompt(originals, target)).content, len(originals))
+        for i, (key, text) in enumerate(missing.items()):
+            if batch is None:
+                translations[key] = _translate(text, llm, target)
+            else:
+                translations[key] = batch[i]
+                memory.put(target, key, batch[i])
+
+    results = []
+    for text in texts:
+        translation = translations[normalize_text(text)]
+        results.append(text if translation is None else translation)
+    return results
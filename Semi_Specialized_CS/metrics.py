@@ -0,0 +1,200 @@
+import json
+import time
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import ensure_config
+
+from tracing import token_usage
+
+
+COUNTERS = (
+    ('calls', 'graph_node_calls_total', 'Number of times each graph node ran.'),
+    ('seconds', 'graph_node_seconds_total', 'Wall time spent in each graph node.'),
+    ('prompt_tokens', 'graph_node_prompt_tokens_total', 'LLM prompt tokens used by each graph node.'),
+    ('completion_tokens', 'graph_node_completion_tokens_total', 'LLM completion tokens used by each graph node.'),
+    ('sql_seconds', 'graph_node_sql_seconds_total', 'Time each graph node held a database connection.'),
+    ('cache_hits', 'graph_node_cache_hits_total', 'Query result cache hits in each graph node.'),
+    ('cache_misses', 'graph_node_cache_misses_total', 'Query result cache misses in each graph node.'),
+    ('errors', 'graph_node_errors_total', 'Graph node runs that raised.'),
+)
+
+
+class NodeMetrics:
+    """Counters per (thread_id, graph node): wall time, LLM tokens, SQL time and cache hits."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: dict.fromkeys((key for key, _, _ in COUNTERS), 0))
+
+    def add(self, thread_id: Optional[str], node: str, **counts: float) -> None:
+        with self._lock:
+            stats = self._stats[(thread_id, node)]
+            for key, value in counts.items():
+                stats[key] += value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _snapshot(self) -> Dict[Tuple[Optional[str], str], Dict[str, float]]:
+        with self._lock:
+            return {key: dict(stats) for key, stats in self._stats.items()}
+
+    @staticmethod
+    def _summarize(stats: Dict[str, float]) -> Dict[str, float]:
+        summary = dict(stats)
+        summary['mean_ms'] = round(1000 * stats['seconds'] / stats['calls'], 3) if stats['calls'] else 0.0
+        return summary
+
+    def report(self) -> Dict[str, Any]:
+        """Totals per node, plus the same counters broken down per thread."""
+        nodes = defaultdict(lambda: dict.fromkeys((key for key, _, _ in COUNTERS), 0))
+        threads = defaultdict(dict)
+        for (thread_id, node), stats in self._snapshot().items():
+            for key, value in stats.items():
+                nodes[node][key] += value
+            threads[str(thread_id)][node] = self._summarize(stats)
+        return {
+            'nodes': {node: self._summarize(stats) for node, stats in nodes.items()},
+            'threads': dict(threads),
+        }
+
+    def to_json(self, **kwargs: Any) -> str:
+        return json.dumps(self.report(), **kwargs)
+
+    def to_prometheus(self, per_thread: bool = False) -> str:
+        """Render the counters in the Prometheus text exposition format.
+
+        Args:
+            per_thread (bool): Add a `thread_id` label. Off by default, since every
+                conversation would otherwise create its own series.
+        """
+        if per_thread:
+            series = self._snapshot()
+        else:
+            series = defaultdict(lambda: dict.fromkeys((key for key, _, _ in COUNTERS), 0))
+            for (_, node), stats in self._snapshot().items():
+                for key, value in stats.items():
+                    series[(None, node)][key] += value
+
+        lines = []
+        for key, metric, help_text in COUNTERS:
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} counter")
+            for (thread_id, node), stats in sorted(series.items(), key=lambda item: (item[0][1], str(item[0][0]))):
+                labels = f'node="{_escape(node)}"'
+                if per_thread:
+                    labels += f',thread_id="{_escape(str(thread_id))}"'
+                lines.append(f"{metric}{{{labels}}} {stats[key]}")
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def record(**counts: float) -> None:
+    """Add `counts` to the graph node of the run that is calling, if a `NodeMetricsCallbackHandler` watches it.
+
+    The run comes from the runnable config langchain keeps for the running
+    code, which also reaches async nodes and tool executor threads.
+    """
+    callbacks = ensure_config().get('callbacks')
+    run_id = getattr(callbacks, 'parent_run_id', None)
+    if run_id is None:
+        return
+    for handler in getattr(callbacks, 'handlers', ()):
+        if isinstance(handler, NodeMetricsCallbackHandler):
+            handler.record(run_id, **counts)
+
+
+class NodeMetricsCallbackHandler(BaseCallbackHandler):
+    """Attributes wall time and LLM tokens of a graph run to its nodes.
+
+    The nodes are the direct children of the graph's root run. Runs are
+    mapped to their node through `parent_run_id`, so `record` can report SQL
+    time and cache hits of database and cache code against the node whose
+    run is calling, in sync and async graphs alike.
+    """
+
+    def __init__(self, metrics: NodeMetrics, thread_id: Optional[str] = None) -> None:
+        self.metrics = metrics
+        self.thread_id = thread_id
+        self._lock = threading.Lock()
+        self._roots = set()
+        self._parents = {}
+        # run_id -> (node name, start time)
+        self._nodes = {}
+
+    def on_chain_start(
+        self, serialized: Dict[str, Any], inputs: Any, *,
+        run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any,
+    ) -> None:
+        name = kwargs.get('name') or (serialized or {}).get('name') or 'unknown'
+        with self._lock:
+            if parent_run_id is None:
+                self._roots.add(run_id)
+                return
+            self._parents[run_id] = parent_run_id
+            if parent_run_id not in self._roots:
+                return
+            self._nodes[run_id] = (name, time.perf_counter())
+
+    def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=False)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id, error=True)
+
+    def on_llm_end(
+        self, response: LLMResult, *, run_id: UUID, parent_run_id: Optional[UUID] = None, **kwargs: Any,
+    ) -> None:
+        node = self._node_of(parent_run_id)
+        if node is None:
+            return
+        counts = {'prompt_tokens': 0, 'completion_tokens': 0}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, 'message', None)
+                if message is not None:
+                    for key, value in token_usage(message).items():
+                        counts[key] += value
+        self.metrics.add(self.thread_id, node, **counts)
+
+    def record(self, run_id: UUID, **counts: float) -> None:
+        """Add `counts` to the node `run_id` belongs to."""
+        node = self._node_of(run_id)
+        if node is not None:
+            self.metrics.add(self.thread_id, node, **counts)
+
+    def _node_of(self, run_id: Optional[UUID]) -> Optional[str]:
+        with self._lock:
+            while run_id is not None:
+                if run_id in self._nodes:
+                    return self._nodes[run_id][0]
+                run_id = self._parents.get(run_id)
+        return None
+
+    def _end(self, run_id: UUID, error: bool) -> None:
+        with self._lock:
+            self._roots.discard(run_id)
+            self._parents.pop(run_id, None)
+            node = self._nodes.pop(run_id, None)
+        if node is None:
+            return
+        name, start = node
+        self.metrics.add(
+            self.thread_id, name, calls=1, seconds=time.perf_counter() - start, errors=int(error),
+        )
+
+
+_node_metrics = NodeMetrics()
+
+
+def get_node_metrics() -> NodeMetrics:
+    return _node_metrics
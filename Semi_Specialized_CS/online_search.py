@@ -2,9 +2,9 @@ from typing import Optional
 
 from langchain_core.language_models import BaseChatModel
 from langchain_community.tools.tavily_search import TavilyAnswer
-from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 
-from llm_translation import translate_to_persian
+from llm_translation import translate_to_persian, atranslate_to_persian
 
 
 class PersianTavilySearchTool(TavilyAnswer):
@@ -40,3 +40,23 @@ class PersianTavilySearchTool(TavilyAnswer):
             return result_text
         except Exception as e:
             return repr(e)
+
+    async def _arun(
+        self,
+        query: str,
+        run_manager: Optional[AsyncCallbackManagerForToolRun] = None,
+    ) -> str:
+        """Use the tool asynchronously."""
+        try:
+            persian_query = await atranslate_to_persian(query, self.llm)
+
+            result_text = (await self.api_wrapper.raw_results_async(
+                persian_query,
+                max_results=self.max_results,
+                include_answer=True,
+                search_depth='basic',
+            ))['answer']
+
+            return result_text
+        except Exception as e:
+            return repr(e)
@@ -0,0 +1,125 @@
+import os
+import threading
+from typing import Optional
+
+from langchain_cohere import ChatCohere, CohereEmbeddings
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+
+from database import Database
+from policy import Policy
+from flight import FlightManager
+from CarRental import CarManager
+from Hotel import HotelManager
+from Excursion import ExcursionsManager
+
+
+class Resources:
+    """Process-wide container for the LLM, database, policy store and managers.
+
+    Every member is built lazily on first access and then reused, so graph nodes
+    such as `fetch_user_info` do not rebuild the travel database on each turn.
+    Pre-built objects can be injected through the constructor (e.g. in notebooks).
+    """
+
+    def __init__(
+        self,
+        data_dir: str = "storage",
+        llm: Optional[BaseChatModel] = None,
+        embedding: Optional[Embeddings] = None,
+        database: Optional[Database] = None,
+        policy: Optional[Policy] = None,
+        multilingual_policy: bool = False,
+    ) -> None:
+        self.data_dir = data_dir
+        self.multilingual_policy = multilingual_policy
+        self._lock = threading.RLock()
+        self._llm = llm
+        self._embedding = embedding
+        self._database = database
+        self._policy = policy
+        self._flight_manager = None
+        self._car_manager = None
+        self._hotel_manager = None
+        self._excursions_manager = None
+
+    @property
+    def llm(self) -> BaseChatModel:
+        with self._lock:
+            if self._llm is None:
+                self._llm = ChatCohere()
+            return self._llm
+
+    @property
+    def embedding(self) -> Embeddings:
+        with self._lock:
+            if self._embedding is None:
+                self._embedding = CohereEmbeddings()
+            return self._embedding
+
+    @property
+    def database(self) -> Database:
+        with self._lock:
+            if self._database is None:
+                self._database = Database(data_dir=os.path.join(self.data_dir, "database"))
+            return self._database
+
+    @property
+    def policy(self) -> Policy:
+        with self._lock:
+            if self._policy is None:
+                self._policy = Policy(
+                    data_dir=os.path.join(self.data_dir, "policy"),
+                    llm=self.llm,
+                    embedding=self.embedding,
+                    multilingual=self.multilingual_policy,
+                )
+            return self._policy
+
+    @property
+    def flight_manager(self) -> FlightManager:
+        with self._lock:
+            if self._flight_manager is None:
+                self._flight_manager = FlightManager(self.database, self.llm)
+            return self._flight_manager
+
+    @property
+    def car_manager(self) -> CarManager:
+        with self._lock:
+            if self._car_manager is None:
+                self._car_manager = CarManager(self.database, self.llm)
+            return self._car_manager
+
+    @property
+    def hotel_manager(self) -> HotelManager:
+        with self._lock:
+            if self._hotel_manager is None:
+                self._hotel_manager = HotelManager(self.database, self.llm)
+            return self._hotel_manager
+
+    @property
+    def excursions_manager(self) -> ExcursionsManager:
+        with self._lock:
+            if self._excursions_manager is None:
+                self._excursions_manager = ExcursionsManager(self.database, self.llm)
+            return self._excursions_manager
+
+
+_resources: Optional[Resources] = None
+_resources_lock = threading.Lock()
+
+
+def get_resources() -> Resources:
+    """Return the shared `Resources`, creating a default one on first use."""
+    global _resources
+    with _resources_lock:
+        if _resources is None:
+            _resources = Resources()
+        return _resources
+
+
+def set_resources(resources: Resources) -> None:
+    """Replace the shared `Resources` (dependency injection for tests and notebooks)."""
+    global _resources
+    with _resources_lock:
+        _resources = resources
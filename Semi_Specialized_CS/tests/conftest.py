@@ -0,0 +1,15 @@
+import os
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The package modules import each other by their flat names
+sys.path.insert(0, PACKAGE_DIR)
+
+# Both packages use the same flat names, so when pytest collects them together
+# drop the modules already imported from the other package
+for _name, _module in list(sys.modules.items()):
+    _file = getattr(_module, '__file__', None)
+    if _file and os.path.dirname(os.path.dirname(os.path.abspath(_file))) == os.path.dirname(PACKAGE_DIR) \
+            and os.path.dirname(os.path.abspath(_file)) != PACKAGE_DIR:
+        del sys.modules[_name]
@@ -0,0 +1,86 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from cache import ResultCache
+from database import ConnectionPool, Database
+from flight import FlightManager
+
+
+# Flight times keep their own offset in the snapshot, like the travel database
+OFFSET = timezone(timedelta(hours=-4))
+FIRST_DEPARTURE = datetime(2030, 1, 1, tzinfo=OFFSET)
+
+# Naive bounds, off the half hours the flights leave at, as the model sends them
+BOUNDS = [
+    (datetime(2030, 1, 1, 5, 15), datetime(2030, 1, 1, 9, 45)),
+    (datetime(2030, 1, 1, 22, 10), datetime(2030, 1, 2, 2, 50)),
+    (datetime(2030, 1, 2, 23, 59), None),
+    (None, datetime(2030, 1, 1, 3, 5)),
+]
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database.__new__(Database)
+    db.data_dir = str(tmp_path)
+    db.cache = ResultCache()
+    db._flight_tz = None
+
+    connection = sqlite3.connect(db.db_path)
+    connection.execute("CREATE TABLE bookings (book_ref TEXT, book_date TEXT, total_amount REAL)")
+    connection.execute(
+        "CREATE TABLE flights (flight_id INTEGER, flight_no TEXT, scheduled_departure TEXT, scheduled_arrival TEXT,"
+        " departure_airport TEXT, arrival_airport TEXT, status TEXT, aircraft_code TEXT,"
+        " actual_departure TEXT, actual_arrival TEXT)"
+    )
+    for i in range(3 * 48):
+        departure = FIRST_DEPARTURE + timedelta(minutes=30 * i)
+        connection.execute(
+            "INSERT INTO flights (flight_id, flight_no, scheduled_departure, departure_airport, arrival_airport)"
+            " VALUES (?, ?, ?, 'CDG', 'BSL')",
+            (i, f'LX{i}', departure.isoformat(' ', timespec='microseconds')),
+        )
+    db.add_epoch_columns(connection)
+    connection.commit()
+    connection.close()
+
+    db.pool = ConnectionPool(db.db_path, size=1)
+    yield db
+    db.pool.close()
+
+
+def baseline_search(db: Database, start_time, end_time):
+    """The text comparison on `scheduled_departure` that the epoch columns replaced."""
+    query = "SELECT flight_id FROM flights WHERE 1 = 1"
+    params = []
+    if start_time:
+        query += " AND scheduled_departure >= ?"
+        params.append(str(start_time))
+    if end_time:
+        query += " AND scheduled_departure <= ?"
+        params.append(str(end_time))
+    with db.connection() as connection:
+        return {row[0] for row in connection.execute(query, params)}
+
+
+def test_flight_tz_is_the_stored_offset(db):
+    assert db.flight_tz() == OFFSET
+
+
+@pytest.mark.parametrize('start_time, end_time', BOUNDS)
+def test_naive_bounds_match_the_text_comparison(db, start_time, end_time):
+    flights = FlightManager(db, None).search_flights(start_time=start_time, end_time=end_time, limit=1000)
+
+    expected = baseline_search(db, start_time, end_time)
+    assert expected
+    assert {flight['flight_id'] for flight in flights} == expected
+
+
+def test_aware_bounds_are_converted(db):
+    naive = datetime(2030, 1, 1, 5, 15)
+    aware = naive.replace(tzinfo=OFFSET).astimezone(timezone.utc)
+    manager = FlightManager(db, None)
+
+    assert manager.search_flights(start_time=aware, limit=1000) == manager.search_flights(start_time=naive, limit=1000)
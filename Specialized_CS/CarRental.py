@@ -11,7 +11,8 @@ from langchain.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
 
 from database import Database
-from utils import list_of_dict_to_str
+from utils import list_of_dict_to_str, ExecutorToolMixin
+from cache import cached_search, invalidates
 
 #TODO: Complete Description of each fields in  tools input
 
@@ -21,6 +22,7 @@ class CarManager:
         self.db = db
         self.llm = llm
         
+    @cached_search('car_rentals')
     def search_car_rentals(self,
         location: Optional[str] = None,
         name: Optional[str] = None,
@@ -41,31 +43,30 @@ class CarManager:
         Returns:
             list[dict]: A list of car rental dictionaries matching the search criteria.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
-        query = "SELECT * FROM car_rentals WHERE 1=1"
-        params = []
-
-        if location:
-            query += " AND location LIKE ?"
-            params.append(f"%{location}%")
-        if name:
-            query += " AND name LIKE ?"
-            params.append(f"%{name}%")
-        # For our tutorial, we will let you match on any dates and price tier.
-        # (since our toy dataset doesn't have much data)
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        column_names = [column[0] for column in cursor.description]
-        results = [dict(zip(column_names, row)) for row in rows]
-
-        cursor.close()
-        connection.close()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
+
+            query = "SELECT * FROM car_rentals WHERE 1=1"
+            params = []
+
+            if location:
+                query += " AND location LIKE ?"
+                params.append(f"%{location}%")
+            if name:
+                query += " AND name LIKE ?"
+                params.append(f"%{name}%")
+            # For our tutorial, we will let you match on any dates and price tier.
+            # (since our toy dataset doesn't have much data)
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            column_names = [column[0] for column in cursor.description]
+            results = [dict(zip(column_names, row)) for row in rows]
+
         
-        return results
+            return results
 
 
+    @invalidates('car_rentals')
     def book_car_rental(self, rental_id: int) -> str:
         """
         Book a car rental by its ID.
@@ -76,21 +77,20 @@ class CarManager:
         Returns:
             str: A message indicating whether the car rental was successfully booked or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute("UPDATE car_rentals SET booked = 1 WHERE id = ?", (rental_id,))
-        connection.commit()
+            cursor.execute("UPDATE car_rentals SET booked = 1 WHERE id = ?", (rental_id,))
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Car rental {rental_id} successfully booked."
-        else:
-            connection.close()
-            return f"No car rental found with ID {rental_id}."
+            if cursor.rowcount > 0:
+                return f"Car rental {rental_id} successfully booked."
+            else:
+                return f"No car rental found with ID {rental_id}."
 
 
 
+    @invalidates('car_rentals')
     def update_car_rental(self,
         rental_id: int,
         start_date: Optional[Union[datetime, date]] = None,
@@ -107,29 +107,28 @@ class CarManager:
         Returns:
             str: A message indicating whether the car rental was successfully updated or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        if start_date:
-            cursor.execute(
-                "UPDATE car_rentals SET start_date = ? WHERE id = ?",
-                (start_date, rental_id),
-            )
-        if end_date:
-            cursor.execute(
-                "UPDATE car_rentals SET end_date = ? WHERE id = ?", (end_date, rental_id)
-            )
+            if start_date:
+                cursor.execute(
+                    "UPDATE car_rentals SET start_date = ? WHERE id = ?",
+                    (start_date, rental_id),
+                )
+            if end_date:
+                cursor.execute(
+                    "UPDATE car_rentals SET end_date = ? WHERE id = ?", (end_date, rental_id)
+                )
 
-        connection.commit()
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Car rental {rental_id} successfully updated."
-        else:
-            connection.close()
-            return f"No car rental found with ID {rental_id}."
+            if cursor.rowcount > 0:
+                return f"Car rental {rental_id} successfully updated."
+            else:
+                return f"No car rental found with ID {rental_id}."
 
 
+    @invalidates('car_rentals')
     def cancel_car_rental(self, rental_id: int) -> str:
         """
         Cancel a car rental by its ID.
@@ -140,18 +139,16 @@ class CarManager:
         Returns:
             str: A message indicating whether the car rental was successfully cancelled or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
-        cursor.execute("UPDATE car_rentals SET booked = 0 WHERE id = ?", (rental_id,))
-        connection.commit()
-
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Car rental {rental_id} successfully cancelled."
-        else:
-            connection.close()
-            return f"No car rental found with ID {rental_id}."
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
+
+            cursor.execute("UPDATE car_rentals SET booked = 0 WHERE id = ?", (rental_id,))
+            connection.commit()
+
+            if cursor.rowcount > 0:
+                return f"Car rental {rental_id} successfully cancelled."
+            else:
+                return f"No car rental found with ID {rental_id}."
         
     def get_tools(self) -> Dict[str, BaseTool]:
         tools = [
@@ -171,7 +168,7 @@ class search_car_rentals_Input(BaseModel):
     start_date: Optional[Union[datetime, date]] = Field(description='start_date (Optional[Union[datetime, date]]): The start date of the car rental.')
     end_date: Optional[Union[datetime, date]] = Field(description='end_date (Optional[Union[datetime, date]]): The end date of the car rental.')
     
-class search_car_rentals_Tool(BaseTool):
+class search_car_rentals_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'search_car_rentals_tool'
     description = (
@@ -183,6 +180,9 @@ class search_car_rentals_Tool(BaseTool):
     return_direct: bool = False
 
     car_manager: CarManager
+    output_format: str = 'items'
+    output_columns: Optional[List[str]] = None
+    max_rows: Optional[int] = None
 
     def _run(
         self, 
@@ -202,14 +202,19 @@ class search_car_rentals_Tool(BaseTool):
         results = self.car_manager.search_car_rentals(
             location, name, price_tier, start_date, end_date
         )
-        return list_of_dict_to_str(results)
+        return list_of_dict_to_str(
+            results,
+            max_rows=self.max_rows,
+            tabular=self.output_format == 'table',
+            columns=self.output_columns,
+        )
     
     
 class book_car_rental_Input(BaseModel):
     rental_id: Optional[int] = Field(description='rental_id (int): The ID of the car rental to book.')
 
 
-class book_car_rental_Tool(BaseTool):
+class book_car_rental_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'book_car_rental_tool'
     description = (
@@ -245,7 +250,7 @@ class update_car_rental_Input(BaseModel):
     end_date: Optional[Union[datetime, date]] = Field(description='end_date (Optional[Union[datetime, date]]): The new end date of the car rental. Defaults to None.')
 
 
-class update_car_rental_Tool(BaseTool):
+class update_car_rental_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'update_car_rental_tool'
     description = (
@@ -284,7 +289,7 @@ class cancel_car_rental_Input(BaseModel):
     rental_id: Optional[int] = Field(description='rental_id (int): The ID of the car rental to cancel.')
 
 
-class cancel_car_rental_Tool(BaseTool):
+class cancel_car_rental_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'cancel_car_rental_tool'
     description = (
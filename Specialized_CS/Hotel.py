@@ -10,7 +10,8 @@ from langchain.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
 
 from database import Database
-from utils import list_of_dict_to_str
+from utils import list_of_dict_to_str, ExecutorToolMixin
+from cache import cached_search, invalidates
 
 #TODO: Complete Description of each fields in  tools input
 #TODO: also we can change input of each tools to better understanding from LLM
@@ -21,6 +22,7 @@ class HotelManager:
         self.db = db
         self.llm = llm
         
+    @cached_search('hotels')
     def search_hotels(
         self,
         location: Optional[str] = None,
@@ -42,27 +44,28 @@ class HotelManager:
         Returns:
             list[dict]: A list of hotel dictionaries matching the search criteria.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
-        query = "SELECT * FROM hotels WHERE 1=1"
-        params = []
-
-        if location:
-            query += " AND location LIKE ?"
-            params.append(f"%{location}%")
-        if name:
-            query += " AND name LIKE ?"
-            params.append(f"%{name}%")
-        # For the sake of this tutorial, we will let you match on any dates and price tier.
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        column_names = [column[0] for column in cursor.description]
-        results = [dict(zip(column_names, row)) for row in rows]
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        return results
+            query = "SELECT * FROM hotels WHERE 1=1"
+            params = []
+
+            if location:
+                query += " AND location LIKE ?"
+                params.append(f"%{location}%")
+            if name:
+                query += " AND name LIKE ?"
+                params.append(f"%{name}%")
+            # For the sake of this tutorial, we will let you match on any dates and price tier.
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            column_names = [column[0] for column in cursor.description]
+            results = [dict(zip(column_names, row)) for row in rows]
+
+            return results
 
 
+    @invalidates('hotels')
     def book_hotel(self, hotel_id: int) -> str:
         """
         Book a hotel by its ID.
@@ -73,21 +76,20 @@ class HotelManager:
         Returns:
             str: A message indicating whether the hotel was successfully booked or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute("UPDATE hotels SET booked = 1 WHERE id = ?", (hotel_id,))
-        connection.commit()
+            cursor.execute("UPDATE hotels SET booked = 1 WHERE id = ?", (hotel_id,))
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Hotel {hotel_id} successfully booked."
-        else:
-            connection.close()
-            return f"No hotel found with ID {hotel_id}."
+            if cursor.rowcount > 0:
+                return f"Hotel {hotel_id} successfully booked."
+            else:
+                return f"No hotel found with ID {hotel_id}."
 
 
 
+    @invalidates('hotels')
     def update_hotel(
         self,
         hotel_id: int,
@@ -105,29 +107,28 @@ class HotelManager:
         Returns:
             str: A message indicating whether the hotel was successfully updated or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        if checkin_date:
-            cursor.execute(
-                "UPDATE hotels SET checkin_date = ? WHERE id = ?", (checkin_date, hotel_id)
-            )
-        if checkout_date:
-            cursor.execute(
-                "UPDATE hotels SET checkout_date = ? WHERE id = ?",
-                (checkout_date, hotel_id),
-            )
+            if checkin_date:
+                cursor.execute(
+                    "UPDATE hotels SET checkin_date = ? WHERE id = ?", (checkin_date, hotel_id)
+                )
+            if checkout_date:
+                cursor.execute(
+                    "UPDATE hotels SET checkout_date = ? WHERE id = ?",
+                    (checkout_date, hotel_id),
+                )
 
-        connection.commit()
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Hotel {hotel_id} successfully updated."
-        else:
-            connection.close()
-            return f"No hotel found with ID {hotel_id}."
+            if cursor.rowcount > 0:
+                return f"Hotel {hotel_id} successfully updated."
+            else:
+                return f"No hotel found with ID {hotel_id}."
 
 
+    @invalidates('hotels')
     def cancel_hotel(self, hotel_id: int) -> str:
         """
         Cancel a hotel by its ID.
@@ -138,18 +139,16 @@ class HotelManager:
         Returns:
             str: A message indicating whether the hotel was successfully cancelled or not.
         """
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
 
-        cursor.execute("UPDATE hotels SET booked = 0 WHERE id = ?", (hotel_id,))
-        connection.commit()
+            cursor.execute("UPDATE hotels SET booked = 0 WHERE id = ?", (hotel_id,))
+            connection.commit()
 
-        if cursor.rowcount > 0:
-            connection.close()
-            return f"Hotel {hotel_id} successfully cancelled."
-        else:
-            connection.close()
-            return f"No hotel found with ID {hotel_id}."
+            if cursor.rowcount > 0:
+                return f"Hotel {hotel_id} successfully cancelled."
+            else:
+                return f"No hotel found with ID {hotel_id}."
 
         
     def get_tools(self) -> Dict[str, BaseTool]:
@@ -176,7 +175,7 @@ class search_hotels_Input(BaseModel):
         )
 
 
-class search_hotels_Tool(BaseTool):
+class search_hotels_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'search_hotels_tool'
     description = (
@@ -191,13 +190,16 @@ class search_hotels_Tool(BaseTool):
             checkout_date (Optional[Union[datetime, date]]): The check-out date of the hotel. Defaults to None.
 
         Returns:
-            list[dict]: A list of hotel dictionaries matching the search criteria.
+            str: The hotels matching the search criteria, one entry per hotel.
         """
     )
     args_schema: Type[BaseModel] = search_hotels_Input
     return_direct: bool = False
 
     hotel_manager: HotelManager
+    output_format: str = 'items'
+    output_columns: Optional[List[str]] = None
+    max_rows: Optional[int] = None
 
     def _run(
         self, 
@@ -211,14 +213,19 @@ class search_hotels_Tool(BaseTool):
         results = self.hotel_manager.search_hotels(
             location, name, price_tier, checkin_date, checkout_date
         )
-        return list_of_dict_to_str(results)
+        return list_of_dict_to_str(
+            results,
+            max_rows=self.max_rows,
+            tabular=self.output_format == 'table',
+            columns=self.output_columns,
+        )
     
 
 class book_hotel_Input(BaseModel):
     hotel_id: Optional[int] = Field(description='hotel_id (int): The ID of the hotel to update.')
 
 
-class book_hotel_Tool(BaseTool):
+class book_hotel_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'book_hotel_tool'
     description = (
@@ -258,7 +265,7 @@ class update_hotel_Input(BaseModel):
         )
 
 
-class update_hotel_Tool(BaseTool):
+class update_hotel_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'update_hotel_tool'
     description = (
@@ -296,7 +303,7 @@ class cancel_hotel_Input(BaseModel):
     hotel_id: Optional[int] = Field(description='hotel_id (int): The ID of the hotel to cancel.')
 
 
-class cancel_hotel_Tool(BaseTool):
+class cancel_hotel_Tool(ExecutorToolMixin, BaseTool):
 
     name = 'cancel_hotel_tool'
     description = (
@@ -1,20 +1,17 @@
-from langchain_cohere import ChatCohere, CohereEmbeddings
 from langchain_community.tools.tavily_search import TavilySearchResults
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.language_models import BaseChatModel
 from agent import Assistant
 from datetime import datetime
+import threading
+from functools import cached_property, lru_cache
 
-from database import Database
-from typing import List, Union
-from policy import Policy
+from typing import Any, Dict, List, Optional, Tuple, Union
 from online_search import PersianTavilySearchTool
-from flight import FlightManager
-from CarRental import CarManager
-from Hotel import HotelManager
-from Excursion import ExcursionsManager
 from llm_translation import translate_to_persian
+from resources import Resources, get_resources
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from typing import Callable
@@ -22,37 +19,29 @@ from langchain_core.tools import BaseTool
 
 
 
-# initialize tools and LLM
-llm = ChatCohere()
-embedding = CohereEmbeddings()
-database = Database(data_dir="storage/database")
-policy = Policy(data_dir="storage/policy", llm=llm, embedding=embedding)
-flight_manager = FlightManager(database, llm)
-car_manager = CarManager(database, llm)
-hotel_manager = HotelManager(database, llm) 
-excursions_manager = ExcursionsManager(database, llm)
-
-flight_tools = flight_manager.get_tools()
-search_flights = flight_tools['search_flights_tool']
-user_flight = flight_tools['fetch_user_flight_information_tool']
-update_ticket_to_new_flight = flight_tools['update_ticket_to_new_flight_tool']
-cancel_ticket = flight_tools['cancel_ticket_tool']
+# (name, description, args_schema) -> rendered block; tool instances are not hashable
+_TOOL_DESCRIPTIONS: Dict[Tuple[str, str, Any], str] = {}
 
 
 def get_tool_description(tool: BaseTool) -> str:
-    tool_params = [
-        f"{name}: {info.get('type', ' ')} ({info.get('description', ' ')})"
-        for name, info in tool.args.items()
-    ]
-    tool_params_string = ', '.join(tool_params)
-    return (
-        f"tool_name -> {tool.name}\n"
-        f"tool_params -> {tool_params_string}\n"
-        f"tool_description ->\n{tool.description}"
-    )
+    key = (tool.name, tool.description, tool.args_schema)
+    description = _TOOL_DESCRIPTIONS.get(key)
+    if description is None:
+        tool_params = [
+            f"{name}: {info.get('type', ' ')} ({info.get('description', ' ')})"
+            for name, info in tool.args.items()
+        ]
+        tool_params_string = ', '.join(tool_params)
+        description = _TOOL_DESCRIPTIONS[key] = (
+            f"tool_name -> {tool.name}\n"
+            f"tool_params -> {tool_params_string}\n"
+            f"tool_description ->\n{tool.description}"
+        )
+    return description
     
 
-    
+
+@lru_cache(maxsize=None)
 def get_model_description(model: BaseModel) -> str:
     # Extract the class name
     model_name = model.__name__
@@ -77,14 +66,8 @@ def get_model_description(model: BaseModel) -> str:
     return result
 
 def get_description(tools: List[Union[BaseTool, BaseModel]]) -> str:
-    models_list = []
-    tools_list = []
-    for i in tools:
-        try:
-            i.name
-            tools_list.append(i) 
-        except:
-            models_list.append(i)           
+    models_list = [tool for tool in tools if isinstance(tool, type)]
+    tools_list = [tool for tool in tools if not isinstance(tool, type)]
     baseModel_desc = '\n\n'.join([get_model_description(tool) for tool in models_list])
     baseTool_desc = '\n\n'.join([get_tool_description(tool) for tool in tools_list])
     return baseModel_desc + baseTool_desc
@@ -141,6 +124,11 @@ flight_booking_prompt = ChatPromptTemplate.from_messages(
             "ACTION": "<the action to take, must be one tool_name from above tools>",
             "ACTION_PARAMS": "<the input parameters to the ACTION, it must be in json format complying with the tool_params>"
 
+            JSON blob when you need several independent tools at once MUST have ONLY following keys:
+
+            "THOUGHT": "<you should always think about what to do>",
+            "ACTIONS": "<a list with one JSON object per tool call, each having the "ACTION" and "ACTION_PARAMS" keys described above>"
+
             JSON blob when you do not need to use a tool MUST have ONLY following keys:
             "THOUGHT": "<you should always think about what to do>",
             "FINAL_ANSWER": "<a text containing the final answer to the original input question>",
@@ -157,13 +145,7 @@ flight_booking_prompt = ChatPromptTemplate.from_messages(
         ),
         ("placeholder", "{messages}"),
     ]
-).partial(time=datetime.now())
-
-update_flight_safe_tools = [search_flights, user_flight]
-update_flight_sensitive_tools = [update_ticket_to_new_flight, cancel_ticket]
-update_flight_tools = update_flight_safe_tools + update_flight_sensitive_tools
-flight_tools_all = update_flight_tools + [CompleteOrEscalate]
-update_flight_runnable = flight_booking_prompt.partial(tool_descs = get_description(flight_tools_all)) | llm
+)
 
 # # Hotel Booking Assistant
 # book_hotel_prompt = ChatPromptTemplate.from_messages(
@@ -368,6 +350,11 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
             "ACTION": "<the action to take, must be one tool_name from above tools>",
             "ACTION_PARAMS": "<the input parameters to the ACTION, it must be in json format complying with the tool_params>"
 
+            JSON blob when you need several independent tools at once MUST have ONLY following keys:
+
+            "THOUGHT": "<you should always think about what to do>",
+            "ACTIONS": "<a list with one JSON object per tool call, each having the "ACTION" and "ACTION_PARAMS" keys described above>"
+
             JSON blob when you do not need to use a tool MUST have ONLY following keys:
             "THOUGHT": "<you should always think about what to do>",
             "FINAL_ANSWER": "<a text containing the final answer to the original input question>",
@@ -381,17 +368,89 @@ primary_assistant_prompt = ChatPromptTemplate.from_messages(
             "\nCurrent time: {time}."),
         ("placeholder", "{messages}"),
     ]
-).partial(time=datetime.now())
-primary_assistant_tools = [
-    PersianTavilySearchTool(max_results=20, llm=llm),
-    # search_flights,
-    policy.get_tools()['lookup_policy_tool'],
-]
-
-primary_tools = primary_assistant_tools + [
-        ToFlightBookingAssistant,
-        # ToBookCarRental,
-        # ToHotelBookingAssistant,
-        # ToBookExcursion,
-    ]
-assistant_runnable = primary_assistant_prompt.partial(tool_descs=get_description(primary_tools)) | llm
\ No newline at end of file
+)
+
+
+class SpecializedAssistants:
+    """Builds the LLM, tools and runnables of the specialized assistants on first use.
+
+    Nothing is constructed at import time: each member is created the first
+    time it is accessed, from `resources` (the shared `Resources` by default).
+    Separate instances can hold different configurations in one process.
+    """
+
+    def __init__(self, resources: Optional[Resources] = None) -> None:
+        self.resources = resources or get_resources()
+
+    @cached_property
+    def llm(self) -> BaseChatModel:
+        return self.resources.llm
+
+    @cached_property
+    def flight_tools(self) -> Dict[str, BaseTool]:
+        return self.resources.flight_manager.get_tools()
+
+    @cached_property
+    def update_flight_safe_tools(self) -> List[BaseTool]:
+        return [self.flight_tools['search_flights_tool'], self.flight_tools['fetch_user_flight_information_tool']]
+
+    @cached_property
+    def update_flight_sensitive_tools(self) -> List[BaseTool]:
+        return [self.flight_tools['update_ticket_to_new_flight_tool'], self.flight_tools['cancel_ticket_tool']]
+
+    @cached_property
+    def update_flight_tools(self) -> List[BaseTool]:
+        return self.update_flight_safe_tools + self.update_flight_sensitive_tools
+
+    @cached_property
+    def flight_tools_all(self) -> List[Union[BaseTool, type]]:
+        return self.update_flight_tools + [CompleteOrEscalate]
+
+    @cached_property
+    def update_flight_runnable(self) -> Runnable:
+        return flight_booking_prompt.partial(
+            time=datetime.now(), tool_descs=get_description(self.flight_tools_all)
+        ) | self.llm
+
+    @cached_property
+    def primary_assistant_tools(self) -> List[BaseTool]:
+        return [
+            PersianTavilySearchTool(max_results=20, llm=self.llm),
+            # search_flights,
+            self.resources.policy.get_tools()['lookup_policy_tool'],
+        ]
+
+    @cached_property
+    def primary_tools(self) -> List[Union[BaseTool, type]]:
+        return self.primary_assistant_tools + [
+            ToFlightBookingAssistant,
+            # ToBookCarRental,
+            # ToHotelBookingAssistant,
+            # ToBookExcursion,
+        ]
+
+    @cached_property
+    def assistant_runnable(self) -> Runnable:
+        return primary_assistant_prompt.partial(
+            time=datetime.now(), tool_descs=get_description(self.primary_tools)
+        ) | self.llm
+
+
+_assistants: Optional[SpecializedAssistants] = None
+_assistants_lock = threading.Lock()
+
+
+def get_assistants() -> SpecializedAssistants:
+    """Return the shared `SpecializedAssistants`, built from the shared `Resources`."""
+    global _assistants
+    with _assistants_lock:
+        if _assistants is None:
+            _assistants = SpecializedAssistants()
+        return _assistants
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps `from Specialized_Assistants import llm, primary_tools, ...` working without eager construction
+    if not name.startswith('_') and isinstance(getattr(SpecializedAssistants, name, None), cached_property):
+        return getattr(get_assistants(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
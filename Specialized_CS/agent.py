@@ -1,19 +1,23 @@
-from typing import List, Dict, Annotated, Any, Optional, Sequence, Literal
+from typing import List, Dict, Annotated, Any, Optional, Sequence, Literal, Tuple, Mapping
 from typing_extensions import TypedDict
 
 import uuid
 import json
+import asyncio
+import time
+import threading
 import warnings
+from types import MappingProxyType
 from datetime import datetime
 
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langchain_community.chat_models import ChatOllama
-from langchain_cohere import ChatCohere, CohereEmbeddings
 from langchain_community.embeddings import OllamaEmbeddings
 from langchain_core.messages import SystemMessage, AIMessage, HumanMessage, AnyMessage, ToolCall, ToolMessage
 from langchain_core.messages.base import get_msg_title_repr
 from langchain_core.tools import BaseTool
 from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import get_executor_for_config
 from langgraph.prebuilt import ToolNode
 
 from langgraph.utils import RunnableCallable
@@ -24,19 +28,21 @@ from langgraph.graph.graph import CompiledGraph
 from langgraph.prebuilt.tool_node import tools_condition
 from langgraph.graph.message import add_messages
 
-from database import Database
-from policy import Policy
 from online_search import PersianTavilySearchTool
-from flight import FlightManager
-from CarRental import CarManager
-from Hotel import HotelManager
-from Excursion import ExcursionsManager
 from llm_translation import translate_to_persian
+from resources import Resources, get_resources
+from memory import MessageWindow
+from utils import is_transient_error, repair_json
+from tracing import TracingCallbackHandler, get_tracer, token_usage, trace_id_from_config
+from metrics import NodeMetricsCallbackHandler, get_node_metrics
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from typing import Callable
 
-    
+
+# Answer given when the model gives no usable reply
+NO_ANSWER = "مدل پاسخی ندارد"
+
     
 def update_dialog_stack(left: list[str], right: Optional[str]) -> list[str]:
     """Push or pop the state."""
@@ -63,83 +69,297 @@ class State(TypedDict):
         update_dialog_stack,
     ]
 
-def create_entry_node(assistant_name: str, new_dialog_state: str) -> Callable:
+def create_entry_node(
+    assistant_name: str, new_dialog_state: str, tool_name: Optional[str] = None
+) -> Callable:
     def entry_node(state: State) -> dict:
-        tool_call_id = state["messages"][-1].tool_calls[0]["id"]
+        tool_calls = state["messages"][-1].tool_calls
+        # Answer the delegating call first, whatever its position in the turn
+        tool_calls = sorted(tool_calls, key=lambda tc: tc["name"] != tool_name)
+        messages = [
+            ToolMessage(
+                content=f"The assistant is now the {assistant_name}. Reflect on the above conversation between the host assistant and the user."
+                f" The user's intent is unsatisfied. Use the provided tools to assist the user. Remember, you are {assistant_name},"
+                " and the booking, update, other other action is not complete until after you have successfully invoked the appropriate tool."
+                " If the user changes their mind or needs help for other tasks, call the CompleteOrEscalate function to let the primary host assistant take control."
+                " Do not mention who you are - just act as the proxy for the assistant.",
+                tool_call_id=tool_calls[0]["id"],
+            )
+        ]
+        # Any other calls made in the same turn are not run once the dialog is delegated
+        messages += [
+            ToolMessage(
+                content=f"Not executed: control was handed to the {assistant_name}.",
+                tool_call_id=tool_call["id"],
+            )
+            for tool_call in tool_calls[1:]
+        ]
         return {
-            "messages": [
-                ToolMessage(
-                    content=f"The assistant is now the {assistant_name}. Reflect on the above conversation between the host assistant and the user."
-                    f" The user's intent is unsatisfied. Use the provided tools to assist the user. Remember, you are {assistant_name},"
-                    " and the booking, update, other other action is not complete until after you have successfully invoked the appropriate tool."
-                    " If the user changes their mind or needs help for other tasks, call the CompleteOrEscalate function to let the primary host assistant take control."
-                    " Do not mention who you are - just act as the proxy for the assistant.",
-                    tool_call_id=tool_call_id,
-                )
-            ],
+            "messages": messages,
             "dialog_state": new_dialog_state,
         }
 
     return entry_node
+
+
+def _tool_output(output: Any) -> str:
+    return output if isinstance(output, str) else json.dumps(output, ensure_ascii=False, default=str)
+
+
+def _tool_error(tool_call: ToolCall, error: Exception) -> ToolMessage:
+    return ToolMessage(
+        content=f"Error: {repr(error)}\n please fix your mistakes.",
+        name=tool_call['name'],
+        tool_call_id=tool_call['id'],
+    )
+
+
+def create_tool_node(tools: Sequence[BaseTool]) -> RunnableLambda:
+    """Graph node running every tool call of the last AI message.
+
+    Errors are caught per call, so each ToolMessage reports the result of
+    its own call: one failing call does not make the successful ones of the
+    same batch, writes included, look failed to the model.
+    """
+    tools_by_name = {tool.name: tool for tool in tools}
+
+    def get_tool(name: str) -> BaseTool:
+        if name not in tools_by_name:
+            raise ValueError(f"{name} is not a valid tool, try one of [{', '.join(tools_by_name)}].")
+        return tools_by_name[name]
+
+    def run_tools(state: State, config: RunnableConfig) -> Dict:
+        def run_one(tool_call: ToolCall) -> ToolMessage:
+            try:
+                output = get_tool(tool_call['name']).invoke(tool_call['args'], config)
+            except Exception as e:
+                return _tool_error(tool_call, e)
+            return ToolMessage(content=_tool_output(output), name=tool_call['name'], tool_call_id=tool_call['id'])
+
+        with get_executor_for_config(config) as executor:
+            return {'messages': list(executor.map(run_one, state['messages'][-1].tool_calls))}
+
+    async def arun_tools(state: State, config: RunnableConfig) -> Dict:
+        async def run_one(tool_call: ToolCall) -> ToolMessage:
+            try:
+                output = await get_tool(tool_call['name']).ainvoke(tool_call['args'], config)
+            except Exception as e:
+                return _tool_error(tool_call, e)
+            return ToolMessage(content=_tool_output(output), name=tool_call['name'], tool_call_id=tool_call['id'])
+
+        messages = await asyncio.gather(*(run_one(tool_call) for tool_call in state['messages'][-1].tool_calls))
+        return {'messages': list(messages)}
+
+    return RunnableLambda(run_tools, arun_tools, name='tools')
+
+
+def parse_actions(content_json: Any) -> Tuple[List[Tuple[str, Dict]], Any]:
+    """Split a parsed JSON reply into its (ACTION, ACTION_PARAMS) pairs and FINAL_ANSWER.
+
+    A reply may hold a single ACTION, an `ACTIONS` list of action objects, or be
+    a JSON list of action objects; several actions become parallel tool calls.
+    """
+    if isinstance(content_json, list):
+        blobs = content_json
+    else:
+        blobs = content_json.get('ACTIONS') or [content_json]
+        if isinstance(blobs, str):
+            blobs = json.loads(blobs)
+    blobs = [blob for blob in blobs if isinstance(blob, dict)]
+
+    actions = []
+    for blob in blobs:
+        action = (blob.get('ACTION') or '').replace(' ', '')
+        if not action:
+            continue
+        action_params = blob.get('ACTION_PARAMS') or {}
+        if type(action_params) is str:
+            action_params = json.loads(action_params)
+        actions.append((action, action_params))
+
+    head = content_json if isinstance(content_json, dict) else (blobs[0] if blobs else {})
+    return actions, head.get('FINAL_ANSWER')
+
+
+def build_tool_registry(tools: Sequence[Any]) -> Mapping[str, Tuple[Any, Optional[type]]]:
+    """Map each tool name to `(tool, args_schema)`.
+
+    `BaseTool` instances are keyed by their `name`; pydantic route models such as
+    `CompleteOrEscalate` are keyed by their class name and are their own schema.
+    """
+    registry = {}
+    for tool in tools:
+        if isinstance(tool, type):
+            registry[tool.__name__] = (tool, tool)
+        else:
+            registry[tool.name] = (tool, getattr(tool, 'args_schema', None))
+    return MappingProxyType(registry)
+
+
 class Assistant:
-    def __init__(self, runnable: Runnable, tools: List[BaseTool]):
+    def __init__(
+        self,
+        runnable: Runnable,
+        tools: List[BaseTool],
+        window: Optional[MessageWindow] = None,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        native_tool_calls: bool = False,
+        name: str = 'assistant',
+    ):
+        """
+        Args:
+            runnable (Runnable): The prompt | llm chain of this assistant. With `native_tool_calls`
+                it must be built with `llm.bind_tools(tools)` so replies carry `tool_calls`.
+            tools (List[BaseTool]): The tools the assistant may call.
+            window (Optional[MessageWindow]): Trims the message history before each call.
+            max_retries (int): How many times a malformed reply is sent back to the model per turn,
+                and how many times a rate-limited or failed model call is repeated.
+            retry_backoff (float): Delay in seconds before repeating a rate-limited or failed model call,
+                doubled on each attempt. Malformed replies are sent back right away.
+            native_tool_calls (bool): Use the model's own tool calling instead of the JSON text protocol.
+            name (str): Name of the graph node, used in trace events.
+        """
         self.runnable = runnable
         self.tools = tools
+        self.registry = build_tool_registry(tools)
+        self.window = window
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.native_tool_calls = native_tool_calls
+        self.name = name
+        self._metrics_lock = threading.Lock()
+        self.metrics = {'turns': 0, 'retries': 0, 'repaired': 0, 'exhausted': 0, 'max_retries_in_turn': 0}
 
-    def __call__(self, state: State, config: RunnableConfig):
-        while True:
-            print(state)
-            if isinstance(state['messages'][-1], ToolMessage):
-                if not state['messages'][-1].content:
-                    state['messages'][-1].content = 'Checked parameters of called tool again and return a Json Blob with correct and alternative parameters \
-                        in "ACTION_PARAMS"'
-            
-            result = self.runnable.invoke(state, config)
+    def _record_turn(
+        self, config: RunnableConfig, started: float, llm_seconds: float, usage: Dict[str, int],
+        retries: int, repaired: int, exhausted: bool, actions: List[Tuple[str, Dict]],
+        raw_reply: Optional[str] = None,
+    ) -> None:
+        with self._metrics_lock:
+            self.metrics['turns'] += 1
+            self.metrics['retries'] += retries
+            self.metrics['repaired'] += repaired
+            self.metrics['exhausted'] += int(exhausted)
+            self.metrics['max_retries_in_turn'] = max(self.metrics['max_retries_in_turn'], retries)
+
+        get_tracer().emit(
+            'span', trace_id_from_config(config), name=self.name,
+            duration_ms=round(1000 * (time.perf_counter() - started), 3),
+            llm_ms=round(1000 * llm_seconds, 3), retries=retries, repaired=repaired,
+            exhausted=exhausted, actions=[action for action, _ in actions], raw_reply=raw_reply, **usage,
+        )
+
+    def _check_actions(self, actions: List[Tuple[str, Dict]]) -> Optional[str]:
+        """Validate actions against the registry and return a correction for the model, if any."""
+        for action, action_params in actions:
+            if action not in self.registry:
+                return f"The ACTION `{action}` does not exist!"
+            schema = self.registry[action][1]
+            if schema is None:
+                continue
             try:
-                if result.content == '':
-                    # no answer from model
-                    warnings.warn('WRONG EMPTY RESPOND: ' + result.content)
-                    final_answer = ""
-                    break
-                    
-                parser = JsonOutputParser()                    
-                content_json = parser.invoke(result.content)
+                schema.parse_obj(action_params)
             except ValueError as e:
-                warnings.warn('BAD FORMAT: \n' + result.content)
-                state['messages'] += [result, HumanMessage("Respond with a valid json output!")]
-                continue
-            
-            if isinstance(content_json, list):
-                content_json = content_json[0]
-            action = content_json.get('ACTION', '').replace(' ', '')
-            action_params = content_json.get('ACTION_PARAMS') or {}
-            if type(action_params) is str:
-                action_params = json.loads(action_params)
-            final_answer = content_json.get('FINAL_ANSWER')
-            toolsModelInstance_list = []
-            toolsToolInstance_list = []
-            for i in self.tools:
+                return (
+                    f"The ACTION_PARAMS of `{action}` are invalid:\n{e}\n"
+                    'Return a Json Blob with corrected parameters in "ACTION_PARAMS"'
+                )
+        return None
+
+    def _invoke(self, inputs: Dict, config: RunnableConfig) -> AIMessage:
+        """Call the model, backing off only on rate limits and transport failures."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.runnable.invoke(inputs, config)
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient_error(e):
+                    raise
+                time.sleep(self.retry_backoff * 2 ** attempt)
+
+    @staticmethod
+    def _parse(content: str) -> Tuple[List[Tuple[str, Dict]], Any, bool]:
+        """Parse a JSON reply, repairing it locally before the model is asked again."""
+        try:
+            content_json = JsonOutputParser().invoke(content)
+            repaired = False
+        except ValueError:
+            content_json = repair_json(content)
+            repaired = True
+        actions, final_answer = parse_actions(content_json)
+        return actions, final_answer, repaired
+
+    def __call__(self, state: State, config: RunnableConfig):
+        if isinstance(state['messages'][-1], ToolMessage):
+            if not state['messages'][-1].content:
+                state['messages'][-1].content = 'Checked parameters of called tool again and return a Json Blob with correct and alternative parameters \
+                    in "ACTION_PARAMS"'
+
+        messages = state['messages']
+        if self.window is not None:
+            messages = self.window(messages, config)
+
+        started = time.perf_counter()
+        llm_seconds = 0.0
+        usage = {'prompt_tokens': 0, 'completion_tokens': 0}
+        # Corrections go to the model only; they are not written into the graph state
+        retry_messages = []
+        repaired = 0
+        exhausted = False
+        for attempt in range(self.max_retries + 1):
+            llm_started = time.perf_counter()
+            result = self._invoke({**state, 'messages': messages + retry_messages}, config)
+            llm_seconds += time.perf_counter() - llm_started
+            for key, count in token_usage(result).items():
+                usage[key] += count
+
+            if self.native_tool_calls:
+                actions = [(tool_call['name'], tool_call['args']) for tool_call in result.tool_calls]
+                final_answer = None if actions else result.content
+            elif result.content == '':
+                # no answer from model
+                warnings.warn('WRONG EMPTY RESPOND: ' + result.content)
+                actions, final_answer = [], ""
+                break
+            else:
                 try:
-                    i.name
-                    toolsToolInstance_list.append(i.name)
-                except:
-                    toolsModelInstance_list.append(i.__name__)
-                    
-            tools_name = toolsModelInstance_list + toolsToolInstance_list
-            print(tools_name)
-            if action and action not in tools_name:
-                warnings.warn('BAD TOOL NAME: ' + result.content)
-                state['messages'] += [result, HumanMessage(f"The ACTION `{action}` does not exist!")]
+                    actions, final_answer, was_repaired = self._parse(result.content)
+                except (ValueError, TypeError, AttributeError):
+                    warnings.warn('BAD FORMAT: \n' + result.content)
+                    retry_messages += [result, HumanMessage("Respond with a valid json output!")]
+                    continue
+                repaired += int(was_repaired)
+
+            correction = self._check_actions(actions)
+            if correction:
+                warnings.warn('BAD TOOL CALL: ' + correction)
+                if self.native_tool_calls:
+                    result = AIMessage(result.content, id=result.id)
+                retry_messages += [result, HumanMessage(correction)]
                 continue
             break
+        else:
+            # Out of retries: give the fixed fallback answer instead of looping forever. The last
+            # reply is usually a broken JSON blob, so it is only kept in the trace.
+            actions, final_answer = [], NO_ANSWER
+            exhausted = True
+        self._record_turn(
+            config, started, llm_seconds, usage, attempt, repaired, exhausted, actions,
+            raw_reply=result.content if exhausted else None,
+        )
 
-        if action and not final_answer:
-            tool_call = ToolCall(name=action, args=action_params, id=str(uuid.uuid4()))
-            result.tool_calls.append(tool_call)
+        if self.native_tool_calls and actions:
+            return {'messages': result}
+
+        if actions and not final_answer:
+            result.tool_calls.extend(
+                ToolCall(name=action, args=action_params, id=str(uuid.uuid4()))
+                for action, action_params in actions
+            )
             return {'messages': result}
         
         if not final_answer:
-            persian_final_answer = "مدل پاسخی ندارد"
+            persian_final_answer = NO_ANSWER
         else:
             pass
             # persian_final_answer = translate_to_persian(final_answer, self.runnable)
@@ -151,43 +371,67 @@ class Assistant:
 
         return {'messages': final_result}
     
-def user_info(state: State):
-    llm = ChatCohere()
-    database = Database(data_dir="storage/database")
-    flight_data = FlightManager(db=database, llm=llm)
-    fetch_user_info_tool = flight_data.get_tools().get('fetch_user_flight_information_tool')
-    data = fetch_user_info_tool.invoke({})
-    return {"user_info": data}
+def create_user_info_node(resources: Optional[Resources] = None) -> Callable:
+    """Build the `fetch_user_info` node on the flights of `resources` (the shared `Resources` by default)."""
+    resources = resources or get_resources()
+
+    def user_info(state: State):
+        fetch_user_info_tool = resources.flight_manager.get_tools().get('fetch_user_flight_information_tool')
+        data = fetch_user_info_tool.invoke({})
+        return {"user_info": data}
+
+    return user_info
 
 
 class Agent:
 
-    def __init__(self) -> None:
-        self.database = Database(data_dir="storage/database")
+    def __init__(self, verbose: bool = False) -> None:
+        self.verbose = verbose
+        self.database = get_resources().database
         self._printed_messages = set()
 
-    def _print_event(
-        self, event: dict, printed_messages: set,
-    ) -> None:
+    def _log_event(self, event: dict, config: Dict) -> None:
+        """Record the messages of a graph event that were not seen yet; print them if `verbose`."""
+        tracer = get_tracer()
+        trace_id = trace_id_from_config(config)
+        traced = tracer.sampled(trace_id)
         current_state = event.get('dialog_state')
-        if current_state:
+        if current_state and self.verbose:
             print(f"Currently in: ", current_state[-1])
 
-        messages = event.get('messages')
-        if messages:
-            for message in messages:
-                if message.id not in printed_messages:
-                    msg_repr = message.pretty_repr(html=True)
-                    print(msg_repr)
-                    printed_messages.add(message.id)
+        messages = event.get('messages') or []
+        for message in messages:
+            if message.id in self._printed_messages:
+                continue
+            self._printed_messages.add(message.id)
+            if traced:
+                tracer.emit(
+                    'message', trace_id, id=message.id, type=message.type, chars=len(str(message.content)),
+                    tool_calls=[tool_call['name'] for tool_call in getattr(message, 'tool_calls', [])],
+                    dialog_state=current_state[-1] if current_state else None,
+                )
+            if self.verbose:
+                print(message.pretty_repr(html=True))
+
+    @staticmethod
+    def _with_callbacks(config: Dict) -> Dict:
+        """Attach per-node metrics and, for sampled threads, tool tracing to the run config."""
+        tracer = get_tracer()
+        trace_id = trace_id_from_config(config)
+        callbacks = list(config.get('callbacks') or [])
+        callbacks.append(NodeMetricsCallbackHandler(get_node_metrics(), trace_id))
+        if tracer.sampled(trace_id):
+            callbacks.append(TracingCallbackHandler(tracer, trace_id))
+        return {**config, 'callbacks': callbacks}
 
 
     def run(
         self, question: str, config: Dict, _graph: CompiledGraph,
         reset_db: bool = True, clear_message_history: bool = True,
     ) -> None:
+        config = self._with_callbacks(config)
         if reset_db:
-            self.database.reset_and_prepare()
+            self.database.reset()
 
         new_messages = []
         if clear_message_history:
@@ -200,7 +444,7 @@ class Agent:
         )
 
         for event in events:
-            self._print_event(event, self._printed_messages)
+            self._log_event(event, config)
         
         snapshot = _graph.get_state(config)
         while snapshot.next:
@@ -211,14 +455,15 @@ class Agent:
             #                         )
             user_input = "i dont want to use that tool"
             y = "y"
-            print('user answer is Y')
+            if self.verbose:
+                print('user answer is Y')
             # if user_input.strip() == "y":
             if y == "y":
                 result = _graph.invoke(
                     None,
                     config,
                 )                   
-                self._print_event(result, self._printed_messages)
+                self._log_event(result, config)
             else:
             # Satisfy the tool invocation by
             # providing instructions on the requested changes / change of mind
@@ -226,14 +471,15 @@ class Agent:
                         {
                             "messages": [
                                 ToolMessage(
-                                    tool_call_id=event["messages"][-1].tool_calls[0]["id"],
+                                    tool_call_id=tool_call["id"],
                                     content=f"API call denied by user. Reasoning: '{user_input}'. Continue assisting, accounting for the user's input.",
                                 )
+                                for tool_call in event["messages"][-1].tool_calls
                             ]
                         },
                         config,
                     )
-                self._print_event(result, self._printed_messages)   
+                self._log_event(result, config)   
                 
                 
             snapshot = _graph.get_state(config)
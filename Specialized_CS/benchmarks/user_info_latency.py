@@ -0,0 +1,171 @@
+"""Per-turn latency of the `fetch_user_info` step: a new `Database` per turn vs a shared one.
+
+Before `Resources`, the node built `Database(data_dir=...)` on every user turn,
+which re-prepares the snapshot (copy, time shift, epoch columns, indexes) and
+restores the working file before running the one query it needs. Now the
+database is built once and each turn only runs the query.
+
+The travel database cannot be fetched everywhere, so a synthetic one with the
+row counts of travel2.sqlite (scaled by `--scale`) is generated first:
+
+    python benchmarks/user_info_latency.py --turns 5 --scale 1.0
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from flight import FlightManager
+
+
+# Row counts of travel2.sqlite
+ROWS = {
+    'bookings': 262_788,
+    'tickets': 366_733,
+    'ticket_flights': 1_045_726,
+    'boarding_passes': 579_686,
+    'flights': 33_121,
+}
+
+SCHEMA = """
+CREATE TABLE bookings (book_ref TEXT, book_date TEXT, total_amount INTEGER);
+CREATE TABLE tickets (ticket_no TEXT, book_ref TEXT, passenger_id TEXT);
+CREATE TABLE ticket_flights (ticket_no TEXT, flight_id INTEGER, fare_conditions TEXT, amount INTEGER);
+CREATE TABLE boarding_passes (ticket_no TEXT, flight_id INTEGER, boarding_no INTEGER, seat_no TEXT);
+CREATE TABLE flights (
+    flight_id INTEGER, flight_no TEXT, scheduled_departure TEXT, scheduled_arrival TEXT,
+    departure_airport TEXT, arrival_airport TEXT, status TEXT, aircraft_code TEXT,
+    actual_departure TEXT, actual_arrival TEXT
+);
+CREATE TABLE hotels (id INTEGER, name TEXT, location TEXT, price_tier TEXT, checkin_date TEXT, checkout_date TEXT, booked INTEGER);
+CREATE TABLE car_rentals (id INTEGER, name TEXT, location TEXT, price_tier TEXT, start_date TEXT, end_date TEXT, booked INTEGER);
+CREATE TABLE trip_recommendations (id INTEGER, name TEXT, location TEXT, keywords TEXT, details TEXT, booked INTEGER);
+"""
+
+OFFSET = timezone(timedelta(hours=-4))
+
+
+def _stamp(value: datetime) -> str:
+    return value.isoformat(' ', timespec='microseconds')
+
+
+def build_travel_db(path: str, scale: float, seed: int = 0) -> None:
+    """Write a synthetic travel database with the tables and columns `Database` prepares."""
+    rng = random.Random(seed)
+    rows = {table: max(1, int(count * scale)) for table, count in ROWS.items()}
+    start = datetime(2024, 4, 1, tzinfo=OFFSET)
+    airports = [f'A{i:02d}' for i in range(104)]
+
+    connection = sqlite3.connect(path)
+    connection.executescript(SCHEMA)
+    connection.executemany(
+        "INSERT INTO bookings VALUES (?, ?, ?)",
+        ((f'B{i:06d}', _stamp(start + timedelta(minutes=i)), rng.randint(3000, 200000)) for i in range(rows['bookings'])),
+    )
+    connection.executemany(
+        "INSERT INTO tickets VALUES (?, ?, ?)",
+        (
+            (f'{i:013d}', f'B{i % rows["bookings"]:06d}', f'{i % 9999:04d} {i:06d}')
+            for i in range(rows['tickets'])
+        ),
+    )
+
+    def flight(i):
+        departure = start + timedelta(minutes=25 * i)
+        arrival = departure + timedelta(hours=2)
+        flown = i % 3 != 0
+        return (
+            i, f'LX{i % 1000:04d}', _stamp(departure), _stamp(arrival),
+            rng.choice(airports), rng.choice(airports), 'Arrived' if flown else 'Scheduled', '319',
+            _stamp(departure) if flown else '\\N', _stamp(arrival) if flown else '\\N',
+        )
+
+    connection.executemany("INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", map(flight, range(rows['flights'])))
+    connection.executemany(
+        "INSERT INTO ticket_flights VALUES (?, ?, 'Economy', ?)",
+        (
+            (f'{i % rows["tickets"]:013d}', rng.randrange(rows['flights']), rng.randint(3000, 200000))
+            for i in range(rows['ticket_flights'])
+        ),
+    )
+    connection.executemany(
+        "INSERT INTO boarding_passes SELECT ticket_no, flight_id, ?, '1A' FROM ticket_flights WHERE rowid = ?",
+        ((i, i + 1) for i in range(rows['boarding_passes'])),
+    )
+    for table in ('hotels', 'car_rentals'):
+        connection.executemany(
+            f"INSERT INTO {table} VALUES (?, ?, 'Basel', 'Midscale', NULL, NULL, 0)",
+            ((i, f'N{i}') for i in range(10)),
+        )
+    connection.executemany(
+        "INSERT INTO trip_recommendations VALUES (?, ?, 'Basel', 'art', 'tour', 0)", ((i, f'N{i}') for i in range(10)),
+    )
+    connection.commit()
+    connection.close()
+
+
+def _passenger(db: Database) -> str:
+    with db.connection() as connection:
+        return connection.execute(
+            "SELECT t.passenger_id FROM tickets t JOIN boarding_passes bp ON bp.ticket_no = t.ticket_no LIMIT 1"
+        ).fetchone()[0]
+
+
+def time_fresh_database(data_dir: str, db_url: str, passenger_id: str, turns: int) -> list:
+    """The node before `Resources`: build the database, then query it."""
+    seconds = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        db = Database(data_dir=data_dir, db_url=db_url)
+        FlightManager(db, None).fetch_user_flight_information(passenger_id)
+        seconds.append(time.perf_counter() - started)
+        db.pool.close()
+    return seconds
+
+
+def time_shared_database(db: Database, passenger_id: str, turns: int) -> list:
+    """The node with `Resources`: query the database built once for the process."""
+    manager = FlightManager(db, None)
+    seconds = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        manager.fetch_user_flight_information(passenger_id)
+        seconds.append(time.perf_counter() - started)
+    return seconds
+
+
+def _report(label: str, seconds: list) -> None:
+    print(
+        f"{label:<24} median {1000 * statistics.median(seconds):10.2f} ms"
+        f"   min {1000 * min(seconds):10.2f} ms   max {1000 * max(seconds):10.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--turns', type=int, default=5, help="user turns timed per variant")
+    parser.add_argument('--scale', type=float, default=1.0, help="fraction of the travel2.sqlite row counts")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, 'travel2.sqlite')
+        build_travel_db(source, args.scale)
+        data_dir = os.path.join(workdir, 'database')
+
+        shared = Database(data_dir=data_dir, db_url=source)
+        passenger_id = _passenger(shared)
+        _report('shared Database', time_shared_database(shared, passenger_id, args.turns))
+        shared.pool.close()
+        _report('Database per turn', time_fresh_database(data_dir, source, passenger_id, args.turns))
+
+
+if __name__ == '__main__':
+    main()
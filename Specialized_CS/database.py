@@ -1,15 +1,169 @@
 import os
+import time
+import queue
+import hashlib
 import shutil
 import requests
 import sqlite3
+import threading
 import pandas as pd
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone, tzinfo
+from typing import Iterator, Optional, Union
+
+from cache import ResultCache
+from metrics import record
+
+
+DB_URL = "https://storage.googleapis.com/benchmarks-artifacts/travel-db/travel2.sqlite"
+# Known SHA-256 of the `DB_URL` artifact. While unset, the digest of the first
+# download is pinned next to the backup and later downloads must match it.
+DB_SHA256: Optional[str] = None
+
+
+# Columns moved forward by `prepare_snapshot` so the example data looks current.
+# `book_date` is normalized to UTC, the flight columns keep their own offset.
+TIME_SHIFT_COLUMNS = {
+    'bookings': {'book_date': True},
+    'flights': {
+        'scheduled_departure': False,
+        'scheduled_arrival': False,
+        'actual_departure': False,
+        'actual_arrival': False,
+    },
+}
+
+# Every shifted column gets an integer `<column>_epoch` shadow column holding
+# seconds since the epoch, so range filters compare integers, not text.
+EPOCH_COLUMNS = {table: list(columns) for table, columns in TIME_SHIFT_COLUMNS.items()}
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if value is None or value == '\\N':
+        return None
+    return datetime.fromisoformat(value)
+
+
+def _shift_timestamp(value: Optional[str], seconds: float, to_utc: int) -> Optional[str]:
+    timestamp = _parse_timestamp(value)
+    if timestamp is None:
+        return None
+    if to_utc:
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        timestamp = timestamp.astimezone(timezone.utc)
+    timestamp += timedelta(seconds=seconds)
+    return timestamp.isoformat(' ', timespec='microseconds')
+
+
+def to_epoch(value: Optional[Union[str, datetime]], naive_tz: tzinfo = timezone.utc) -> Optional[int]:
+    """Seconds since the epoch for a stored timestamp or a `datetime`; naive values are read in `naive_tz`."""
+    if value is None or isinstance(value, str):
+        value = _parse_timestamp(value)
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=naive_tz)
+    return int(value.timestamp())
+
+
+# Indexes backing the manager queries, (re)created by `prepare_snapshot`.
+INDEXES = {
+    'idx_tickets_passenger_id': 'tickets (passenger_id, ticket_no)',
+    'idx_ticket_flights_ticket_no': 'ticket_flights (ticket_no, flight_id)',
+    'idx_boarding_passes_ticket_flight': 'boarding_passes (ticket_no, flight_id)',
+    'idx_flights_flight_id': 'flights (flight_id)',
+    'idx_flights_route': 'flights (departure_airport, arrival_airport, scheduled_departure_epoch)',
+    'idx_flights_arrival': 'flights (arrival_airport, scheduled_departure_epoch)',
+    'idx_flights_scheduled_departure': 'flights (scheduled_departure_epoch)',
+    'idx_hotels_id': 'hotels (id)',
+    'idx_car_rentals_id': 'car_rentals (id)',
+    'idx_trip_recommendations_id': 'trip_recommendations (id)',
+}
+
+
+# Applied to every connection handed out by `Database`.
+CONNECTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,  # KiB, i.e. 16 MB per connection
+    'mmap_size': 268435456,  # 256 MB
+    'temp_store': 'MEMORY',
+}
+
+
+def connect(db_path: str, busy_timeout: float = 30.0) -> sqlite3.Connection:
+    connection = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False)
+    for name, value in CONNECTION_PRAGMAS.items():
+        connection.execute(f"PRAGMA {name} = {value}")
+    return connection
+
+
+def _page_size(db_path: str) -> int:
+    connection = sqlite3.connect(db_path)
+    try:
+        return connection.execute("PRAGMA page_size").fetchone()[0]
+    finally:
+        connection.close()
+
+
+class ConnectionPool:
+    """A fixed-size, thread-safe pool of pre-opened SQLite connections."""
+
+    def __init__(self, db_path: str, size: int = 4) -> None:
+        self.db_path = db_path
+        self.size = size
+        self._lock = threading.Lock()
+        self._connections = []
+        self._idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            connection = connect(db_path)
+            self._connections.append(connection)
+            self._idle.put(connection)
+
+    def acquire(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"no free connection to '{self.db_path}' after {timeout}s")
+
+    def release(self, connection: sqlite3.Connection) -> None:
+        if connection.in_transaction:
+            connection.rollback()
+        self._idle.put(connection)
+
+    def close(self) -> None:
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections = []
 
 
 class Database:
 
-    def __init__(self, data_dir: str) -> None:
+    def __init__(
+        self,
+        data_dir: str,
+        pool_size: int = 4,
+        db_url: str = DB_URL,
+        db_sha256: Optional[str] = DB_SHA256,
+    ) -> None:
+        """
+        Args:
+            data_dir (str): Directory holding the backup, snapshot and working database.
+            pool_size (int): Number of pooled connections.
+            db_url (str): Where to fetch the backup from; an http(s) URL, a `file://` URL or a local path.
+            db_sha256 (Optional[str]): Expected SHA-256 hex digest of the backup, checked after download.
+                None checks against the digest pinned by the first download.
+        """
         self.data_dir = data_dir
+        self.db_url = db_url
+        self.db_sha256 = db_sha256
+        self.cache = ResultCache()
+        self._flight_tz = None
         self.download()
+        self.create_working_file()
+        self.pool = ConnectionPool(self.db_path, size=pool_size)
         self.reset_and_prepare()
 
     @property
@@ -20,26 +174,222 @@ class Database:
     def db_backup_path(self) -> str:
         return os.path.join(self.data_dir, 'travel.backup.sqlite')
 
+    @property
+    def db_digest_path(self) -> str:
+        return self.db_backup_path + '.sha256'
+
+    @property
+    def db_snapshot_path(self) -> str:
+        return os.path.join(self.data_dir, 'travel.snapshot.sqlite')
+
+    def create_working_file(self) -> None:
+        """Create the working database with the page size of the backup.
+
+        `reset` restores into it with the backup API, which cannot change the
+        page size of a WAL database, so the page size is set before the pool
+        switches the file to WAL. A leftover file with another page size is
+        replaced; its content is restored from the snapshot anyway.
+        """
+        page_size = _page_size(self.db_backup_path)
+        if os.path.exists(self.db_path):
+            if _page_size(self.db_path) == page_size:
+                return
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.db_path + suffix):
+                    os.remove(self.db_path + suffix)
+
+        connection = sqlite3.connect(self.db_path)
+        connection.execute(f"PRAGMA page_size = {page_size}")
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.close()
+
+    def flight_tz(self) -> tzinfo:
+        """The UTC offset the flight times are stored in (they keep their own offset when shifted).
+
+        Naive search bounds are read in it, so they mean the same wall-clock
+        time as the stored text they used to be compared with.
+        """
+        if self._flight_tz is None:
+            with self.connection() as connection:
+                row = connection.execute(
+                    "SELECT scheduled_departure FROM flights WHERE scheduled_departure IS NOT NULL LIMIT 1"
+                ).fetchone()
+            stored = _parse_timestamp(row[0]) if row else None
+            self._flight_tz = (stored.tzinfo if stored is not None else None) or timezone.utc
+        return self._flight_tz
+
     def get_connection(self) -> sqlite3.Connection:
-        return sqlite3.connect(self.db_path)
+        """Open a new, unpooled connection; prefer `connection()`."""
+        return connect(self.db_path)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection from the pool for the duration of the block.
+
+        Uncommitted changes are rolled back when the connection is returned.
+        """
+        connection = self.pool.acquire()
+        start = time.perf_counter()
+        try:
+            yield connection
+        finally:
+            self.pool.release(connection)
+            record(sql_seconds=time.perf_counter() - start)
 
-    def download(self, overwrite: bool = False) -> None:
+    def download(
+        self, overwrite: bool = False, retries: int = 3, chunk_size: int = 1 << 20, backoff: float = 1.0,
+    ) -> None:
+        """Fetch the backup into a `.part` file and move it into place once verified.
+
+        HTTP downloads are streamed in `chunk_size` pieces, and an interrupted
+        download resumes from the existing `.part` file with a `Range` request
+        after `backoff` seconds, doubled on each retry. The backup must match
+        `db_sha256`, or else the digest pinned by the first download.
+        """
         if not overwrite and os.path.exists(self.db_backup_path):
             return
 
-        db_url = "https://storage.googleapis.com/benchmarks-artifacts/travel-db/travel2.sqlite"
-        response = requests.get(db_url)
-        response.raise_for_status()
-
         os.makedirs(self.data_dir, exist_ok=True)
-        with open(self.db_backup_path, 'wb') as f:
-            f.write(response.content)
+        part_path = self.db_backup_path + '.part'
+
+        local_path = self.db_url[len('file://'):] if self.db_url.startswith('file://') else self.db_url
+        if os.path.exists(local_path):
+            shutil.copy(local_path, part_path)
+        else:
+            for attempt in range(retries):
+                try:
+                    self._download_part(part_path, chunk_size)
+                    break
+                except requests.RequestException:
+                    if attempt == retries - 1:
+                        raise
+                    time.sleep(backoff * 2 ** attempt)
+
+        expected = self.db_sha256 or self._pinned_sha256()
+        digest = self._sha256(part_path)
+        if expected and digest != expected.lower():
+            os.remove(part_path)
+            raise ValueError(
+                f"checksum mismatch for '{self.db_url}': expected {expected}, got {digest}"
+            )
+
+        os.replace(part_path, self.db_backup_path)
+        if not expected:
+            with open(self.db_digest_path, 'w') as f:
+                f.write(f"{digest}  {self.db_url}\n")
+
+    def _pinned_sha256(self) -> Optional[str]:
+        """The digest pinned by the first download of `db_url`, in `sha256sum` format."""
+        if not os.path.exists(self.db_digest_path):
+            return None
+        with open(self.db_digest_path) as f:
+            digest, _, url = f.read().strip().partition('  ')
+        return digest if url == self.db_url else None
+
+    def _download_part(self, part_path: str, chunk_size: int) -> None:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+        with requests.get(self.db_url, headers=headers, stream=True, timeout=60) as response:
+            if offset and response.status_code == 416:
+                # The partial file already holds the whole artifact
+                return
+            response.raise_for_status()
+
+            mode = 'ab' if offset and response.status_code == 206 else 'wb'
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    f.write(chunk)
+
+    @staticmethod
+    def _sha256(path: str, chunk_size: int = 1 << 20) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def reset_and_prepare(self, in_place: bool = True) -> None:
+        """Rebuild the prepared snapshot from the backup and restore it."""
+        self.prepare_snapshot(in_place)
+        self.reset()
 
-    def reset_and_prepare(self) -> None:
-        shutil.copy(self.db_backup_path, self.db_path)
+    def prepare_snapshot(self, in_place: bool = True) -> None:
+        """Copy the backup, shift all example timestamps to the present and index it.
 
-        connection = self.get_connection()
+        The result is kept as a "golden" snapshot that `reset` restores from.
+        With `in_place=True` only the shifted columns are rewritten through SQL
+        `UPDATE`s in a single transaction, which keeps the original schema.
+        `in_place=False` uses the original pandas round-trip over every table.
+        """
+        shutil.copy(self.db_backup_path, self.db_snapshot_path)
 
+        connection = sqlite3.connect(self.db_snapshot_path)
+        if in_place:
+            self._shift_times_in_place(connection)
+        else:
+            self._shift_times_with_pandas(connection)
+        self.add_epoch_columns(connection)
+        self.create_indexes(connection)
+
+        connection.commit()
+        connection.close()
+
+    def add_epoch_columns(self, connection: sqlite3.Connection) -> None:
+        """Add and fill the `EPOCH_COLUMNS` shadow columns."""
+        connection.create_function('to_epoch', 1, to_epoch, deterministic=True)
+
+        for table, columns in EPOCH_COLUMNS.items():
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            for column in columns:
+                if f"{column}_epoch" not in existing:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {column}_epoch INTEGER")
+            assignments = ', '.join(f"{column}_epoch = to_epoch({column})" for column in columns)
+            connection.execute(f"UPDATE {table} SET {assignments}")
+
+    def create_indexes(self, connection: sqlite3.Connection) -> None:
+        """Create the declared `INDEXES` and refresh the planner statistics."""
+        for name, definition in INDEXES.items():
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+        connection.execute("ANALYZE")
+
+    def reset(self) -> None:
+        """Restore the working database from the prepared snapshot.
+
+        Uses SQLite's online backup API, so no preprocessing is repeated.
+        """
+        if not os.path.exists(self.db_snapshot_path):
+            self.prepare_snapshot()
+
+        source = sqlite3.connect(self.db_snapshot_path)
+        with self.connection() as target:
+            source.backup(target)
+        source.close()
+        self.cache.clear()
+
+    def _shift_times_in_place(self, connection: sqlite3.Connection) -> None:
+        connection.create_function('shift_timestamp', 3, _shift_timestamp, deterministic=True)
+
+        cursor = connection.cursor()
+        cursor.execute("SELECT actual_departure FROM flights")
+        example_time = max(
+            (t for (value,) in cursor for t in [_parse_timestamp(value)] if t is not None),
+            key=lambda t: t.timestamp(),
+        )
+        # Same as `pd.to_datetime('now').tz_localize(example_time.tz)`
+        current_time = datetime.now().replace(tzinfo=example_time.tzinfo)
+        seconds = (current_time - example_time).total_seconds()
+
+        with connection:
+            for table, columns in TIME_SHIFT_COLUMNS.items():
+                assignments = ', '.join(
+                    f"{column} = shift_timestamp({column}, :seconds, {int(to_utc)})"
+                    for column, to_utc in columns.items()
+                )
+                cursor.execute(f"UPDATE {table} SET {assignments}", {'seconds': seconds})
+        cursor.close()
+
+    def _shift_times_with_pandas(self, connection: sqlite3.Connection) -> None:
         tables = pd.read_sql(
             "SELECT name FROM sqlite_master WHERE type='table';", connection
         ).name.tolist()
@@ -71,6 +421,3 @@ class Database:
 
         for table_name, df in tdf.items():
             df.to_sql(table_name, connection, if_exists='replace', index=False)
-
-        connection.commit()
-        connection.close()
@@ -0,0 +1,119 @@
+import os
+import array
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+
+def query_key(text: str, namespace: str = '') -> str:
+    """Hash of a normalized query (NFC, case-folded, whitespace collapsed) within `namespace`."""
+    normalized = ' '.join(unicodedata.normalize('NFC', text).casefold().split())
+    return hashlib.sha256(f"{namespace}\0{normalized}".encode('utf-8')).hexdigest()
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """Wraps an `Embeddings` so repeated queries are embedded only once.
+
+    Query vectors are kept in an in-process LRU and in a SQLite file, keyed by
+    the hash of the normalized query and the embedding model. Document
+    embedding is passed through unchanged.
+
+    Args:
+        embedding (Embeddings): The embedding model to wrap.
+        path (Optional[str]): SQLite file for the persisted vectors. None caches in memory only.
+        hot_size (int): Number of vectors kept in the in-process cache.
+    """
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = None, hot_size: int = 1024) -> None:
+        self.embedding = embedding
+        self.path = path
+        self.hot_size = hot_size
+        self.namespace = f"{type(embedding).__name__}:{getattr(embedding, 'model', '')}"
+        self._lock = threading.Lock()
+        self._hot = OrderedDict()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL) WITHOUT ROWID"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        self._hot[key] = vector
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.hot_size:
+            self._hot.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._hot.get(key)
+            conn = self._connection() if vector is None else None
+            if conn is not None:
+                row = conn.execute("SELECT vector FROM query_embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = array.array('d', row[0]).tolist()
+            if vector is None:
+                self.misses += 1
+                return None
+            self._remember(key, vector)
+            self.hits += 1
+            return vector
+
+    def _store(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._remember(key, vector)
+            conn = self._connection()
+            if conn is not None:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?)",
+                        (key, array.array('d', vector).tobytes()),
+                    )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedding.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.embedding.aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = query_key(text, self.namespace)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = self.embedding.embed_query(text)
+            self._store(key, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = query_key(text, self.namespace)
+        vector = self._lookup(key)
+        if vector is None:
+            vector = await self.embedding.aembed_query(text)
+            self._store(key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'size': len(self._hot),
+            }
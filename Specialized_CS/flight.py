@@ -1,6 +1,6 @@
 from typing import List, Dict, Type, Optional
 
-import pytz
+import time
 from datetime import datetime
 
 from langchain_core.runnables import ensure_config
@@ -9,8 +9,17 @@ from langchain.pydantic_v1 import BaseModel, Field
 from langchain.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
 
-from database import Database
-from utils import list_of_dict_to_str
+from database import Database, to_epoch
+from utils import list_of_dict_to_str, ExecutorToolMixin
+from cache import cached_search
+
+
+# Columns returned by `search_flights` (the `*_epoch` shadow columns are internal)
+FLIGHT_COLUMNS = (
+    'flight_id', 'flight_no', 'scheduled_departure', 'scheduled_arrival',
+    'departure_airport', 'arrival_airport', 'status', 'aircraft_code',
+    'actual_departure', 'actual_arrival',
+)
 
 
 class FlightManager:
@@ -20,9 +29,6 @@ class FlightManager:
         self.llm = llm
 
     def fetch_user_flight_information(self, passenger_id: str) -> List[Dict]:
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
         query = """
         SELECT 
             t.ticket_no, t.book_ref,
@@ -37,16 +43,18 @@ class FlightManager:
             t.passenger_id = ?
         """
 
-        cursor.execute(query, (passenger_id,))
-        rows = cursor.fetchall()
-        column_names = [column[0] for column in cursor.description]
-        results = [dict(zip(column_names, row)) for row in rows]
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query, (passenger_id,))
+            rows = cursor.fetchall()
+            column_names = [column[0] for column in cursor.description]
+            cursor.close()
 
-        cursor.close()
-        connection.close()
+        results = [dict(zip(column_names, row)) for row in rows]
         return results
     
 
+    @cached_search('flights')
     def search_flights(
         self,
         departure_airport: Optional[str] = None,
@@ -55,10 +63,7 @@ class FlightManager:
         end_time: Optional[datetime] = None,
         limit: int = 20,
     ) -> List[Dict]:
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
-        query = "SELECT * FROM flights WHERE 1 = 1"
+        query = f"SELECT {', '.join(FLIGHT_COLUMNS)} FROM flights WHERE 1 = 1"
         params = []
 
         if departure_airport:
@@ -70,24 +75,24 @@ class FlightManager:
             params.append(arrival_airport)
 
         if start_time:
-            query += " AND scheduled_departure >= ?"
-            params.append(start_time)
+            query += " AND scheduled_departure_epoch >= ?"
+            params.append(to_epoch(start_time, self.db.flight_tz()))
 
         if end_time:
-            query += " AND scheduled_departure <= ?"
-            params.append(end_time)
+            query += " AND scheduled_departure_epoch <= ?"
+            params.append(to_epoch(end_time, self.db.flight_tz()))
 
         query += " LIMIT ?"
         params.append(limit)
 
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        column_names = [column[0] for column in cursor.description]
-        results = [dict(zip(column_names, row)) for row in rows]
-
-        cursor.close()
-        connection.close()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            column_names = [column[0] for column in cursor.description]
+            cursor.close()
 
+        results = [dict(zip(column_names, row)) for row in rows]
         return results
 
     def update_ticket_to_new_flight(
@@ -96,66 +101,52 @@ class FlightManager:
         ticket_no: str = None,
         new_flight_id: int = None,
     ) -> str:
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
-        cursor.execute(
-            "SELECT departure_airport, arrival_airport, scheduled_departure FROM flights WHERE flight_id = ?",
-            (new_flight_id,),
-        )
-        new_flight = cursor.fetchone()
-
-        if not new_flight:
-            cursor.close()
-            connection.close()
-            return "Invalid `new_flight_id` provided."
-
-        column_names = [column[0] for column in cursor.description]
-        new_flight_dict = dict(zip(column_names, new_flight))
-        timezone = pytz.timezone("Etc/GMT-3")
-        current_time = datetime.now(tz=timezone)
-        departure_time = datetime.strptime(
-            new_flight_dict["scheduled_departure"], "%Y-%m-%d %H:%M:%S.%f%z"
-        )
-        time_until = (departure_time - current_time).total_seconds()
-        if time_until < (3 * 3600):
-            cursor.close()
-            connection.close()
-            return f"Not permitted to reschedule to a flight that is less than 3 hours from the current time. Selected flight is at {departure_time}."
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
+
+            cursor.execute(
+                "SELECT departure_airport, arrival_airport, scheduled_departure, scheduled_departure_epoch FROM flights WHERE flight_id = ?",
+                (new_flight_id,),
+            )
+            new_flight = cursor.fetchone()
+
+            if not new_flight:
+                return "Invalid `new_flight_id` provided."
+
+            column_names = [column[0] for column in cursor.description]
+            new_flight_dict = dict(zip(column_names, new_flight))
+            departure_time = new_flight_dict["scheduled_departure"]
+            time_until = new_flight_dict["scheduled_departure_epoch"] - time.time()
+            if time_until < (3 * 3600):
+                return f"Not permitted to reschedule to a flight that is less than 3 hours from the current time. Selected flight is at {departure_time}."
+
+            cursor.execute(
+                "SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)
+            )
+            current_flight = cursor.fetchone()
+            if not current_flight:
+                return "No existing ticket found for the given `ticket_no`."
+
+            # Check the signed-in user actually has this ticket
+            cursor.execute(
+                "SELECT * FROM tickets WHERE ticket_no = ? AND passenger_id = ?",
+                (ticket_no, passenger_id),
+            )
+            current_ticket = cursor.fetchone()
+            if not current_ticket:
+                return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
+
+            # In a real application, you'd likely add additional checks here to enforce business logic,
+            # like "does the new departure airport match the current ticket", etc.
+            # While it's best to try to be *proactive* in 'type-hinting' policies to the LLM
+            # it's inevitably going to get things wrong, so you **also** need to ensure your
+            # API enforces valid behavior
+            cursor.execute(
+                "UPDATE ticket_flights SET flight_id = ? WHERE ticket_no = ?",
+                (new_flight_id, ticket_no),
+            )
+            connection.commit()
 
-        cursor.execute(
-            "SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)
-        )
-        current_flight = cursor.fetchone()
-        if not current_flight:
-            cursor.close()
-            connection.close()
-            return "No existing ticket found for the given `ticket_no`."
-
-        # Check the signed-in user actually has this ticket
-        cursor.execute(
-            "SELECT * FROM tickets WHERE ticket_no = ? AND passenger_id = ?",
-            (ticket_no, passenger_id),
-        )
-        current_ticket = cursor.fetchone()
-        if not current_ticket:
-            cursor.close()
-            connection.close()
-            return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
-
-        # In a real application, you'd likely add additional checks here to enforce business logic,
-        # like "does the new departure airport match the current ticket", etc.
-        # While it's best to try to be *proactive* in 'type-hinting' policies to the LLM
-        # it's inevitably going to get things wrong, so you **also** need to ensure your
-        # API enforces valid behavior
-        cursor.execute(
-            "UPDATE ticket_flights SET flight_id = ? WHERE ticket_no = ?",
-            (new_flight_id, ticket_no),
-        )
-        connection.commit()
-
-        cursor.close()
-        connection.close()
         return "Ticket successfully updated to new flight."
 
     def cancel_ticket(
@@ -163,34 +154,28 @@ class FlightManager:
         passenger_id: str = None,
         ticket_no: str  = None
         ) -> str:
-        connection = self.db.get_connection()
-        cursor = connection.cursor()
-
-        cursor.execute(
-            "SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)
-        )
-        existing_ticket = cursor.fetchone()
-        if not existing_ticket:
-            cursor.close()
-            connection.close()
-            return "No existing ticket found for the given `ticket_no`."
-
-        # Check the signed-in user actually has this ticket
-        cursor.execute(
-            "SELECT * FROM tickets WHERE ticket_no = ? AND passenger_id = ?",
-            (ticket_no, passenger_id),
-        )
-        current_ticket = cursor.fetchone()
-        if not current_ticket:
-            cursor.close()
-            connection.close()
-            return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
-
-        cursor.execute("DELETE FROM ticket_flights WHERE ticket_no = ?", (ticket_no,))
-        connection.commit()
+        with self.db.connection() as connection:
+            cursor = connection.cursor()
+
+            cursor.execute(
+                "SELECT flight_id FROM ticket_flights WHERE ticket_no = ?", (ticket_no,)
+            )
+            existing_ticket = cursor.fetchone()
+            if not existing_ticket:
+                return "No existing ticket found for the given `ticket_no`."
+
+            # Check the signed-in user actually has this ticket
+            cursor.execute(
+                "SELECT * FROM tickets WHERE ticket_no = ? AND passenger_id = ?",
+                (ticket_no, passenger_id),
+            )
+            current_ticket = cursor.fetchone()
+            if not current_ticket:
+                return f"Current signed-in passenger with ID {passenger_id} not the owner of ticket {ticket_no}"
+
+            cursor.execute("DELETE FROM ticket_flights WHERE ticket_no = ?", (ticket_no,))
+            connection.commit()
 
-        cursor.close()
-        connection.close()
         return """TOOL MESSAGE: Your ticket has been successfully cancelled. Please note that no further cancellation actions are needed. 
     If you have any questions or require additional assistance, please contact our support team."""
 
@@ -209,18 +194,22 @@ class FetchUserFlightInformationToolInput(BaseModel):
     pass
 
 
-class FetchUserFlightInformationTool(BaseTool):
+class FetchUserFlightInformationTool(ExecutorToolMixin, BaseTool):
 
     name = 'fetch_user_flight_information_tool'
     description = (
         "Fetch all tickets for the user along with corresponding flight information and seat assignments.\n"
-        "Returns A list of dictionaries where each dictionary contains the ticket details, "
-        "associated flight details, and the seat assignments for each ticket belonging to the user."
+        "Returns one entry per ticket belonging to the user, with the ticket details, "
+        "associated flight details, and the seat assignment."
     )
     args_schema: Type[BaseModel] = FetchUserFlightInformationToolInput
     return_direct: bool = False
 
     flight_manager: FlightManager
+    # How results are written for the LLM: 'items' (one block per row) or 'table' (one header line)
+    output_format: str = 'items'
+    output_columns: Optional[List[str]] = None
+    max_rows: Optional[int] = None
 
     def _run(
         self, run_manager: Optional[CallbackManagerForToolRun] = None
@@ -232,7 +221,12 @@ class FetchUserFlightInformationTool(BaseTool):
             raise ValueError("No `passenger_id` configured.")
 
         results = self.flight_manager.fetch_user_flight_information(passenger_id)
-        return list_of_dict_to_str(results)
+        return list_of_dict_to_str(
+            results,
+            max_rows=self.max_rows,
+            tabular=self.output_format == 'table',
+            columns=self.output_columns,
+        )
 
 
 
@@ -248,17 +242,20 @@ class SearchFlightsToolInput(BaseModel):
     limit: Optional[int] = Field(description="specifies the maximum number of search results")
 
 
-class SearchFlightsTool(BaseTool):
+class SearchFlightsTool(ExecutorToolMixin, BaseTool):
 
     name = 'search_flights_tool'
     description = (
         "Search for flights in the database based on departure airport, arrival airport, and departure time range.\n"
-        "Returns A list of dictionaries where each dictionary contains the flight details."
+        "Returns one entry per matching flight with the flight details."
     )
     args_schema: Type[BaseModel] = SearchFlightsToolInput
     return_direct: bool = False
 
     flight_manager: FlightManager
+    output_format: str = 'items'
+    output_columns: Optional[List[str]] = None
+    max_rows: Optional[int] = None
 
     def _run(
         self,
@@ -277,7 +274,12 @@ class SearchFlightsTool(BaseTool):
         results = self.flight_manager.search_flights(
             departure_airport, arrival_airport, start_time, end_time, limit
         )
-        return list_of_dict_to_str(results)
+        return list_of_dict_to_str(
+            results,
+            max_rows=self.max_rows,
+            tabular=self.output_format == 'table',
+            columns=self.output_columns,
+        )
 
 
 
@@ -286,7 +288,7 @@ class UpdateTicketToNewFlightToolInput(BaseModel):
     new_flight_id: int = Field(description="should be a new flight id")
 
 
-class UpdateTicketToNewFlightTool(BaseTool):
+class UpdateTicketToNewFlightTool(ExecutorToolMixin, BaseTool):
 
     name = 'update_ticket_to_new_flight_tool'
     description = (
@@ -320,7 +322,7 @@ class CancelTicketToolInput(BaseModel):
     ticket_no: str = Field(description="should be the user's ticket number")
 
 
-class CancelTicketTool(BaseTool):
+class CancelTicketTool(ExecutorToolMixin, BaseTool):
 
     name = 'cancel_ticket_tool'
     description = (
@@ -0,0 +1,104 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a customer and an airline support assistant "
+    "in a few sentences. Keep ticket numbers, booking references, flight ids, dates and any "
+    "decisions or pending requests. Do not add anything that is not in the conversation.\n\n"
+)
+
+
+class MessageWindow:
+    """Trims `State.messages` before they are rendered into the prompt.
+
+    The last `keep_last_turns` turns (a turn starts at a `HumanMessage`) are kept
+    as they are. Older messages are replaced by one `SystemMessage` holding a
+    rolling summary (when an `llm` is given) and the latest result of each
+    tool in `pinned_tools`, so prompt size stays flat in long sessions.
+    The summary call runs with the caller's config, so callbacks and tracing
+    see it as part of the node that trimmed the messages.
+    """
+
+    def __init__(
+        self,
+        llm: Optional[BaseChatModel] = None,
+        keep_last_turns: int = 4,
+        pinned_tools: Sequence[str] = ('fetch_user_flight_information_tool',),
+        max_summaries: int = 256,
+    ) -> None:
+        self.llm = llm
+        self.keep_last_turns = keep_last_turns
+        self.pinned_tools = set(pinned_tools)
+        self.max_summaries = max_summaries
+        self._lock = threading.Lock()
+        # id of the last summarized message -> summary of everything up to it
+        self._summaries = OrderedDict()
+
+    def __call__(self, messages: List[AnyMessage], config: Optional[RunnableConfig] = None) -> List[AnyMessage]:
+        turn_starts = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+        if len(turn_starts) <= self.keep_last_turns:
+            return messages
+
+        start = turn_starts[-self.keep_last_turns]
+        older, recent = messages[:start], messages[start:]
+
+        notes = []
+        summary = self._summarize(older, config)
+        if summary:
+            notes.append(f"Summary of the earlier conversation:\n{summary}")
+        for name, content in self._pinned_results(older).items():
+            notes.append(f"Result of `{name}` from earlier in the conversation:\n{content}")
+
+        if not notes:
+            return recent
+        return [SystemMessage('\n\n'.join(notes))] + recent
+
+    def _pinned_results(self, messages: List[AnyMessage]) -> Dict[str, str]:
+        call_names = {
+            tool_call['id']: tool_call['name']
+            for message in messages if isinstance(message, AIMessage)
+            for tool_call in message.tool_calls
+        }
+        results = {}
+        for message in messages:
+            if isinstance(message, ToolMessage):
+                name = call_names.get(message.tool_call_id)
+                if name in self.pinned_tools:
+                    results[name] = message.content
+        return results
+
+    def _summarize(self, messages: List[AnyMessage], config: Optional[RunnableConfig] = None) -> Optional[str]:
+        if self.llm is None or not messages:
+            return None
+
+        key = messages[-1].id
+        previous, begin = None, 0
+        with self._lock:
+            for i in range(len(messages) - 1, -1, -1):
+                if messages[i].id is not None and messages[i].id in self._summaries:
+                    previous, begin = self._summaries[messages[i].id], i + 1
+                    break
+        if begin == len(messages):
+            return previous
+
+        transcript = '\n'.join(
+            f"{message.type}: {message.content}" for message in messages[begin:] if message.content
+        )
+        prompt = SUMMARY_PROMPT
+        if previous:
+            prompt += f"Summary so far:\n{previous}\n\nConversation that followed:\n"
+        summary = self.llm.invoke(prompt + transcript, config).content
+
+        if key is not None:
+            with self._lock:
+                self._summaries[key] = summary
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > self.max_summaries:
+                    self._summaries.popitem(last=False)
+        return summary
@@ -1,9 +1,14 @@
-from typing import List, Dict, Any, Iterator, Type, Optional
+from typing import List, Dict, Any, Iterator, Type, Optional, Tuple
 
 import os
 import json
 import re
+import time
+import random
+import hashlib
 import bs4
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
 
 from langchain_core.documents import Document
 from langchain_text_splitters.character import TextSplitter, _split_text_with_regex
@@ -11,12 +16,27 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders.web_base import WebBaseLoader, _build_metadata
 from langchain_community.vectorstores import Chroma
 from langchain_core.embeddings import Embeddings
-from langchain.callbacks.manager import CallbackManagerForToolRun
+from langchain.callbacks.manager import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
 from langchain.pydantic_v1 import BaseModel, Field
 from langchain.tools import BaseTool
 from langchain_core.language_models import BaseChatModel
 
-from llm_translation import translate_to_persian
+from llm_translation import ENGLISH, translate_to_persian, atranslate_to_persian, translate_many
+from utils import run_in_tool_executor
+from cache import ResultCache
+from embedding_cache import CachedQueryEmbeddings, query_key
+from tracing import get_tracer
+
+
+# Chroma's default collection, holding the original FAQ chunks
+DEFAULT_COLLECTION = 'langchain'
+# Chroma collection holding the English translations of the FAQ chunks
+ENGLISH_COLLECTION = 'policy_en'
+
+
+def _document_id(document: Document) -> str:
+    payload = json.dumps([document.page_content, document.metadata], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
 
 
 class FaqWebBaseLoader(WebBaseLoader):
@@ -79,13 +99,29 @@ class Policy:
         data_dir: str,
         llm: BaseChatModel,
         embedding: Embeddings,
-        k: int = 5
+        k: int = 5,
+        multilingual: bool = False,
     ) -> None:
+        """
+        Args:
+            data_dir (str): Directory of the persisted Chroma vectorstore.
+            llm (BaseChatModel): Model used to translate queries or, when `multilingual`, the FAQs.
+            embedding (Embeddings): Embedding model of the vectorstore.
+            k (int): Number of documents to retrieve.
+            multilingual (bool): Also index an English translation of every FAQ chunk, made
+                once at build time, and search both collections so queries need no translation.
+        """
         self.data_dir = data_dir
         self.llm = llm
-        self.embedding = embedding
+        # Repeated questions reuse their query vector instead of calling the embedding API
+        self.embedding = CachedQueryEmbeddings(embedding, os.path.join(data_dir, 'query_embeddings.sqlite'))
+        self.results_cache = ResultCache(maxsize=256, ttl=3600)
+        self.k = k
+        self.multilingual = multilingual
+        self.build_stats = {}
         self.vectorstore = self.get_or_create_vectorstore()
         self.retriever = self.vectorstore.as_retriever(search_kwargs={'k': k})
+        self.english_vectorstore = self.get_or_create_english_vectorstore() if multilingual else None
 
     @property
     def vectorstore_path(self) -> str:
@@ -108,16 +144,133 @@ class Policy:
         splits = text_splitter.split_documents(documents)
         return splits
 
-    def create_vectorstore(self, documents: Iterator[Document]) -> Chroma:
-        return Chroma.from_documents(
-            documents=documents, 
-            embedding=self.embedding,
+    def progress_path(self, collection_name: str = DEFAULT_COLLECTION) -> str:
+        """File that exists while `collection_name` is being built."""
+        return os.path.join(self.data_dir, f'{collection_name}.progress.json')
+
+    def create_vectorstore(
+        self,
+        documents: Iterator[Document],
+        collection_name: str = DEFAULT_COLLECTION,
+        batch_size: int = 96,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        retry_backoff: float = 1.0,
+    ) -> Chroma:
+        """
+        Embed `documents` into a persisted Chroma collection.
+
+        Every document gets an id derived from its content, and each embedded batch
+        is stored as soon as it is ready, so a build that was interrupted resumes
+        with only the documents missing from the collection.
+
+        Args:
+            documents (Iterator[Document]): The chunks to index.
+            collection_name (str): Chroma collection to write to.
+            batch_size (int): Number of documents per embedding request.
+            max_concurrency (int): Maximum number of embedding requests in flight.
+            max_retries (int): Retries of a failed batch before the build is aborted.
+            retry_backoff (float): Delay in seconds before the first retry, doubled on each retry.
+
+        Returns:
+            Chroma: The vectorstore. Throughput is recorded in `self.build_stats`.
+        """
+        vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=self.embedding,
             persist_directory=self.data_dir,
         )
+        unique = {_document_id(document): document for document in documents}
+        with open(self.progress_path(collection_name), 'w') as progress_file:
+            json.dump({'collection': collection_name, 'documents': len(unique)}, progress_file)
+
+        stored = set(vectorstore.get(include=[])['ids'])
+        pending = [(doc_id, document) for doc_id, document in unique.items() if doc_id not in stored]
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+        start = time.perf_counter()
+        embedded = 0
+        executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='embed')
+        try:
+            futures = {
+                executor.submit(
+                    self._embed_with_retry, [document.page_content for _, document in batch],
+                    max_retries, retry_backoff,
+                ): batch
+                for batch in batches
+            }
+            for future in as_completed(futures):
+                batch = futures[future]
+                vectorstore._collection.upsert(
+                    ids=[doc_id for doc_id, _ in batch],
+                    embeddings=future.result(),
+                    documents=[document.page_content for _, document in batch],
+                    metadatas=[document.metadata for _, document in batch],
+                )
+                embedded += len(batch)
+                elapsed = time.perf_counter() - start
+                self.build_stats = {
+                    'collection': collection_name,
+                    'documents': len(unique),
+                    'resumed': len(stored & unique.keys()),
+                    'embedded': embedded,
+                    'seconds': round(elapsed, 3),
+                    'docs_per_sec': round(embedded / elapsed, 2) if elapsed else 0.0,
+                }
+                get_tracer().emit('index_progress', **self.build_stats)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+        os.remove(self.progress_path(collection_name))
+        # Cached results may point at documents of the previous index
+        self.results_cache.clear()
+        return vectorstore
+
+    def _embed_with_retry(self, texts: List[str], max_retries: int, retry_backoff: float) -> List[List[float]]:
+        for attempt in range(max_retries + 1):
+            try:
+                return self.embedding.embed_documents(texts)
+            except Exception:
+                if attempt == max_retries:
+                    raise
+                # Jitter keeps concurrent batches from retrying in lockstep against a rate limit
+                time.sleep(retry_backoff * 2 ** attempt * (1 + random.random()))
+
+    def translate_documents(self, documents: List[Document], batch_size: int = 20) -> List[Document]:
+        """English copies of `documents`, translated in batches, keeping the original text in their metadata."""
+        translated = []
+        for start in range(0, len(documents), batch_size):
+            batch = documents[start:start + batch_size]
+            translations = translate_many([doc.page_content for doc in batch], self.llm, target=ENGLISH)
+            translated.extend(
+                Document(page_content=translation, metadata={**doc.metadata, 'original_content': doc.page_content})
+                for doc, translation in zip(batch, translations)
+            )
+        return translated
+
+    def get_or_create_english_vectorstore(self) -> Chroma:
+        english_vectorstore = Chroma(
+            collection_name=ENGLISH_COLLECTION,
+            embedding_function=self.embedding,
+            persist_directory=self.data_dir,
+        )
+        complete = not os.path.exists(self.progress_path(ENGLISH_COLLECTION))
+        if complete and english_vectorstore.get(limit=1)['ids']:
+            return english_vectorstore
+
+        stored = self.vectorstore.get(include=['documents', 'metadatas'])
+        documents = [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(stored['documents'], stored['metadatas'])
+        ]
+        return self.create_vectorstore(self.translate_documents(documents), collection_name=ENGLISH_COLLECTION)
 
     def load_vectorstore(self) -> Chroma:
         if not os.path.exists(self.vectorstore_path):
             raise FileNotFoundError(f"vectorstore file not found '{self.vectorstore_path}'")
+        if os.path.exists(self.progress_path()):
+            # An interrupted build is resumed by `create_vectorstore`
+            raise FileNotFoundError(f"vectorstore build did not finish '{self.progress_path()}'")
 
         return Chroma(
             embedding_function=self.embedding,
@@ -135,7 +288,40 @@ class Policy:
         return self.create_vectorstore(splits_qa)
 
     def get_relevant_documents(self, query: str) -> Iterator[Document]:
-        return self.retriever.invoke(query)
+        documents = self.results_cache.get_or_compute('policy', query_key(query), lambda: self._search(query))
+        return list(documents)
+
+    async def aget_relevant_documents(self, query: str) -> Iterator[Document]:
+        return await run_in_tool_executor(self.get_relevant_documents, query)
+
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit rates of the query-embedding cache and of the retrieval-result cache."""
+        results = self.results_cache.stats()
+        lookups = results['hits'] + results['misses']
+        results['hit_rate'] = results['hits'] / lookups if lookups else 0.0
+        return {'embeddings': self.embedding.stats(), 'results': results}
+
+    def _search(self, query: str) -> List[Document]:
+        if self.english_vectorstore is None:
+            return self.retriever.invoke(query)
+
+        # One query embedding serves both collections
+        query_embedding = self.embedding.embed_query(query)
+        return self._merge_results(
+            self.vectorstore.similarity_search_by_vector_with_relevance_scores(query_embedding, k=self.k),
+            self.english_vectorstore.similarity_search_by_vector_with_relevance_scores(query_embedding, k=self.k),
+        )
+
+    def _merge_results(self, *results: List[Tuple[Document, float]]) -> List[Document]:
+        """Merge (document, distance) hits of both collections into the `k` closest original FAQs."""
+        best = {}
+        for document, distance in chain.from_iterable(results):
+            original = document.metadata.get('original_content', document.page_content)
+            if original not in best or distance < best[original][1]:
+                metadata = {key: value for key, value in document.metadata.items() if key != 'original_content'}
+                best[original] = (Document(page_content=original, metadata=metadata), distance)
+        ranked = sorted(best.values(), key=lambda item: item[1])
+        return [document for document, _ in ranked[:self.k]]
 
     def get_tools(self) -> Dict[str, BaseTool]:
         tools = [
@@ -165,7 +351,21 @@ class LookupPolicyTool(BaseTool):
     def _run(
         self, query: str, run_manager: Optional[CallbackManagerForToolRun] = None
     ) -> str:
-        docs = self.policy.get_relevant_documents(translate_to_persian(query, self.policy.llm))
+        if not self.policy.multilingual:
+            query = translate_to_persian(query, self.policy.llm)
+        docs = self.policy.get_relevant_documents(query)
+        return self._format_documents(docs)
+
+    async def _arun(
+        self, query: str, run_manager: Optional[AsyncCallbackManagerForToolRun] = None
+    ) -> str:
+        if not self.policy.multilingual:
+            query = await atranslate_to_persian(query, self.policy.llm)
+        docs = await self.policy.aget_relevant_documents(query)
+        return self._format_documents(docs)
+
+    @staticmethod
+    def _format_documents(docs: Iterator[Document]) -> str:
         return '\n\n'.join([
             f"FAQ_SUBJECT: {doc.metadata['subject']}\n{doc.page_content}"
             for doc in docs
@@ -0,0 +1,162 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from cache import ResultCache
+from database import INDEXES, Database
+from flight import FlightManager
+from Hotel import HotelManager
+from CarRental import CarManager
+from Excursion import ExcursionsManager
+
+
+SCHEMA = """
+CREATE TABLE tickets (ticket_no TEXT, book_ref TEXT, passenger_id TEXT);
+CREATE TABLE ticket_flights (ticket_no TEXT, flight_id INTEGER, fare_conditions TEXT, amount REAL);
+CREATE TABLE boarding_passes (ticket_no TEXT, flight_id INTEGER, boarding_no INTEGER, seat_no TEXT);
+CREATE TABLE flights (
+    flight_id INTEGER, flight_no TEXT, scheduled_departure TEXT, scheduled_arrival TEXT,
+    departure_airport TEXT, arrival_airport TEXT, status TEXT, aircraft_code TEXT,
+    actual_departure TEXT, actual_arrival TEXT, scheduled_departure_epoch INTEGER
+);
+CREATE TABLE hotels (id INTEGER, name TEXT, location TEXT, booked INTEGER, checkin_date TEXT, checkout_date TEXT);
+CREATE TABLE car_rentals (id INTEGER, name TEXT, location TEXT, booked INTEGER, start_date TEXT, end_date TEXT);
+CREATE TABLE trip_recommendations (id INTEGER, name TEXT, location TEXT, booked INTEGER, details TEXT);
+"""
+
+START = datetime(2030, 1, 1)
+END = START + timedelta(days=2)
+
+# The manager calls whose statements must be served by an index. The name-matching
+# searches (`LIKE '%...%'`) cannot use one and are left out.
+CALLS = {
+    'FlightManager.fetch_user_flight_information': lambda m: m['flights'].fetch_user_flight_information('P1'),
+    'FlightManager.search_flights (route and time)': lambda m: m['flights'].search_flights('A1', 'A1', START, END),
+    'FlightManager.search_flights (departure)': lambda m: m['flights'].search_flights(departure_airport='A1'),
+    'FlightManager.search_flights (arrival)': lambda m: m['flights'].search_flights(arrival_airport='A1'),
+    'FlightManager.search_flights (arrival and time)': (
+        lambda m: m['flights'].search_flights(arrival_airport='A1', start_time=START, end_time=END)
+    ),
+    'FlightManager.search_flights (time)': lambda m: m['flights'].search_flights(start_time=START, end_time=END),
+    'FlightManager.update_ticket_to_new_flight': (
+        lambda m: m['flights'].update_ticket_to_new_flight('P5', f'{5:016d}', 150)
+    ),
+    'FlightManager.cancel_ticket': lambda m: m['flights'].cancel_ticket('P7', f'{7:016d}'),
+    'HotelManager.book_hotel': lambda m: m['hotels'].book_hotel(1),
+    'HotelManager.update_hotel': lambda m: m['hotels'].update_hotel(1, '2030-01-01', '2030-01-03'),
+    'HotelManager.cancel_hotel': lambda m: m['hotels'].cancel_hotel(1),
+    'CarManager.book_car_rental': lambda m: m['cars'].book_car_rental(1),
+    'CarManager.update_car_rental': lambda m: m['cars'].update_car_rental(1, '2030-01-01', '2030-01-03'),
+    'CarManager.cancel_car_rental': lambda m: m['cars'].cancel_car_rental(1),
+    'ExcursionsManager.book_excursion': lambda m: m['excursions'].book_excursion(1),
+    'ExcursionsManager.update_excursion': lambda m: m['excursions'].update_excursion(1, 'Morning tour'),
+    'ExcursionsManager.cancel_excursion': lambda m: m['excursions'].cancel_excursion(1),
+}
+
+
+class RecordingCursor:
+    """A cursor that records every statement it executes."""
+
+    def __init__(self, cursor: sqlite3.Cursor, statements: list) -> None:
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, query, params=()):
+        self._statements.append((query, tuple(params)))
+        return self._cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class RecordingConnection:
+    """A connection whose cursors record the statements the managers run."""
+
+    def __init__(self, connection: sqlite3.Connection, statements: list) -> None:
+        self._connection = connection
+        self._statements = statements
+
+    def cursor(self) -> RecordingCursor:
+        return RecordingCursor(self._connection.cursor(), self._statements)
+
+    def execute(self, query, params=()):
+        return self.cursor().execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class RecordingDatabase:
+    """Stands in for `Database`, handing the managers one recording in-memory connection."""
+
+    def __init__(self, connection: sqlite3.Connection) -> None:
+        self._connection = connection
+        self.cache = ResultCache()
+        self.statements = []
+
+    @contextmanager
+    def connection(self):
+        yield RecordingConnection(self._connection, self.statements)
+
+    def flight_tz(self):
+        return timezone.utc
+
+
+@pytest.fixture(scope='module')
+def connection():
+    connection = sqlite3.connect(':memory:', check_same_thread=False)
+    connection.executescript(SCHEMA)
+    # Far enough ahead that rebooking passes the three hour rule
+    first_departure = int(time.time()) + 24 * 3600
+    for i in range(200):
+        ticket_no = f'{i:016d}'
+        connection.execute("INSERT INTO tickets VALUES (?, ?, ?)", (ticket_no, f'B{i}', f'P{i % 50}'))
+        connection.execute("INSERT INTO ticket_flights VALUES (?, ?, 'Economy', 100)", (ticket_no, i))
+        connection.execute("INSERT INTO boarding_passes VALUES (?, ?, 1, '1A')", (ticket_no, i))
+        connection.execute(
+            "INSERT INTO flights (flight_id, flight_no, departure_airport, arrival_airport, scheduled_departure_epoch)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (i, f'LX{i}', f'A{i % 20}', f'A{i % 7}', first_departure + 3600 * i),
+        )
+        for table in ('hotels', 'car_rentals', 'trip_recommendations'):
+            connection.execute(f"INSERT INTO {table} (id, name, location, booked) VALUES (?, ?, 'Basel', 0)", (i, f'N{i}'))
+    connection.commit()
+    # `create_indexes` does not touch the instance, so skip the download in `__init__`
+    Database.__new__(Database).create_indexes(connection)
+    yield connection
+    connection.close()
+
+
+@pytest.fixture
+def db(connection):
+    return RecordingDatabase(connection)
+
+
+@pytest.fixture
+def managers(db):
+    return {
+        'flights': FlightManager(db, None),
+        'hotels': HotelManager(db, None),
+        'cars': CarManager(db, None),
+        'excursions': ExcursionsManager(db, None),
+    }
+
+
+def test_indexes_are_created(connection):
+    created = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(INDEXES) <= created
+
+
+@pytest.mark.parametrize('name', CALLS)
+def test_manager_queries_use_indexes(connection, db, managers, name):
+    CALLS[name](managers)
+
+    assert db.statements, name
+    for query, params in db.statements:
+        plan = [row[3] for row in connection.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+        assert plan, query
+        assert all(step.startswith('SEARCH') for step in plan), (query, plan)
+        assert all(' INDEX idx_' in step for step in plan), (query, plan)
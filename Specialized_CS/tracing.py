@@ -0,0 +1,177 @@
+import json
+import time
+import zlib
+import queue
+import random
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO, Union
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+
+
+Sink = Union[str, TextIO, Callable[[Dict[str, Any]], None]]
+
+
+class Tracer:
+    """Structured, sampled trace events written as JSON lines off the hot path.
+
+    Events are queued and written by a background thread, so tracing never
+    blocks a graph node on I/O. Sampling is decided per `trace_id` (the graph
+    `thread_id`), so a sampled conversation is traced completely.
+
+    Args:
+        sink (Optional[Sink]): A file path to append JSON lines to, an open text
+            stream, or a callable that receives each event dict. None disables tracing.
+        sample_rate (float): Fraction of traces to record, between 0 and 1.
+        max_queue (int): Events beyond this many pending ones are dropped and counted.
+    """
+
+    def __init__(self, sink: Optional[Sink] = None, sample_rate: float = 1.0, max_queue: int = 10000) -> None:
+        self.sink = sink
+        self.sample_rate = sample_rate
+        self.dropped = 0
+        self.emitted = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._writer = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sink is not None and self.sample_rate > 0
+
+    def sampled(self, trace_id: Optional[str] = None) -> bool:
+        if not self.enabled:
+            return False
+        if self.sample_rate >= 1:
+            return True
+        if trace_id is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(str(trace_id).encode()) / 2**32 < self.sample_rate
+
+    def emit(self, kind: str, trace_id: Optional[str] = None, **fields: Any) -> None:
+        if self.sampled(trace_id):
+            self._put({'ts': time.time(), 'kind': kind, 'trace_id': trace_id, **fields})
+
+    @contextmanager
+    def span(self, name: str, trace_id: Optional[str] = None, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """Time a block; attributes added to the yielded dict are recorded with the span."""
+        if not self.sampled(trace_id):
+            yield {}
+            return
+        attributes = dict(fields)
+        start = time.perf_counter()
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes['error'] = repr(e)
+            raise
+        finally:
+            self._put({
+                'ts': time.time(), 'kind': 'span', 'trace_id': trace_id, 'name': name,
+                'duration_ms': round(1000 * (time.perf_counter() - start), 3), **attributes,
+            })
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until every queued event has been written."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return
+            time.sleep(0.01)
+
+    def stats(self) -> Dict[str, int]:
+        return {'emitted': self.emitted, 'dropped': self.dropped, 'pending': self._queue.qsize()}
+
+    def _put(self, event: Dict[str, Any]) -> None:
+        self._start_writer()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_writer(self) -> None:
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_loop, name='tracer', daemon=True)
+                self._writer.start()
+
+    def _write_loop(self) -> None:
+        if callable(self.sink) and not hasattr(self.sink, 'write'):
+            write, stream = self.sink, None
+        else:
+            stream = open(self.sink, 'a', encoding='utf-8') if isinstance(self.sink, str) else self.sink
+            write = lambda event: stream.write(json.dumps(event, ensure_ascii=False, default=str) + '\n')
+
+        while True:
+            event = self._queue.get()
+            try:
+                write(event)
+                if stream is not None and self._queue.empty():
+                    stream.flush()
+                self.emitted += 1
+            except Exception:
+                self.dropped += 1
+            finally:
+                self._queue.task_done()
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Records the latency of every tool run as a `tool` event."""
+
+    def __init__(self, tracer: Tracer, trace_id: Optional[str] = None) -> None:
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self._starts = {}
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = ((serialized or {}).get('name'), time.perf_counter())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, None)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, repr(error))
+
+    def _finish(self, run_id: UUID, error: Optional[str]) -> None:
+        name, start = self._starts.pop(run_id, (None, None))
+        if start is not None:
+            self.tracer.emit(
+                'tool', self.trace_id, name=name,
+                duration_ms=round(1000 * (time.perf_counter() - start), 3), error=error,
+            )
+
+
+def token_usage(message: BaseMessage) -> Dict[str, int]:
+    """Prompt and completion token counts reported with a chat model reply, if any."""
+    usage = getattr(message, 'usage_metadata', None)
+    if usage:
+        return {'prompt_tokens': usage.get('input_tokens', 0), 'completion_tokens': usage.get('output_tokens', 0)}
+    metadata = getattr(message, 'response_metadata', None) or {}
+    # ChatCohere reports `token_count`, OpenAI-style models `token_usage`
+    counts = metadata.get('token_count') or metadata.get('token_usage') or {}
+    return {
+        'prompt_tokens': counts.get('input_tokens', counts.get('prompt_tokens', 0)) or 0,
+        'completion_tokens': counts.get('output_tokens', counts.get('completion_tokens', 0)) or 0,
+    }
+
+
+def trace_id_from_config(config: Optional[Dict[str, Any]]) -> Optional[str]:
+    return ((config or {}).get('configurable') or {}).get('thread_id')
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    """Install the process-wide tracer, e.g. `set_tracer(Tracer('storage/traces.jsonl', sample_rate=0.1))`."""
+    global _tracer
+    _tracer = tracer
@@ -1,12 +1,169 @@
-from typing import List, Dict
+import re
+import ast
+import json
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Dict, Iterator, Optional
 
 
-def list_of_dict_to_str(lod: List[Dict]) -> str:
-    result = ""
+# Bounded pool for running blocking tool code (SQLite, sync clients) off the event loop
+TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='tool')
 
-    for i, dic in enumerate(lod):
-        result += f"Item {i+1}:\n"
-        for k, v in dic.items():
-            result += f"-- {k}: {v}\n"
 
-    return result
+async def run_in_tool_executor(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    """Run `func` on `TOOL_EXECUTOR`, keeping the caller's context (e.g. the runnable config)."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(TOOL_EXECUTOR, call)
+
+
+class ExecutorToolMixin:
+    """Gives a `BaseTool` an `_arun` that runs its blocking `_run` on `TOOL_EXECUTOR`."""
+
+    async def _arun(self, *args: Any, **kwargs: Any) -> Any:
+        kwargs.pop('run_manager', None)
+        return await run_in_tool_executor(self._run, *args, **kwargs)
+
+
+def _iter_item_lines(lod: List[Dict], max_rows: int, columns: Optional[List[str]]) -> Iterator[str]:
+    for i, dic in enumerate(lod[:max_rows]):
+        keys = columns or dic.keys()
+        yield f"Item {i+1}:\n" + "".join(f"-- {k}: {dic.get(k)}\n" for k in keys)
+
+
+def _iter_table_lines(
+    lod: List[Dict], max_rows: int, columns: Optional[List[str]], delimiter: str
+) -> Iterator[str]:
+    if not lod:
+        return
+    columns = columns or list(lod[0].keys())
+    yield delimiter.join(columns) + "\n"
+    for dic in lod[:max_rows]:
+        yield delimiter.join(str(dic.get(k, "")) for k in columns) + "\n"
+
+
+def list_of_dict_to_str(
+    lod: List[Dict],
+    max_rows: Optional[int] = None,
+    max_chars: Optional[int] = None,
+    tabular: bool = False,
+    delimiter: str = " | ",
+    columns: Optional[List[str]] = None,
+) -> str:
+    """
+    Format query results for a tool message.
+
+    Args:
+        lod (List[Dict]): The rows to format.
+        max_rows (Optional[int]): Maximum number of rows to include. Defaults to all rows.
+        max_chars (Optional[int]): Rows are dropped once the output would exceed this many characters.
+        tabular (bool): Write the column names once as a header and each row as one delimited line
+            instead of repeating every column name per row.
+        delimiter (str): Separator used by the tabular layout.
+        columns (Optional[List[str]]): Only include these columns, in this order. Defaults to all columns.
+
+    Returns:
+        str: The formatted rows, with a "N more rows omitted" footer when rows were dropped.
+    """
+    if max_rows is None:
+        max_rows = len(lod)
+
+    if tabular:
+        lines = _iter_table_lines(lod, max_rows, columns, delimiter)
+    else:
+        lines = _iter_item_lines(lod, max_rows, columns)
+
+    parts = []
+    size = 0
+    shown_rows = -1 if tabular and lod else 0
+    for line in lines:
+        if max_chars is not None and size + len(line) > max_chars:
+            break
+        parts.append(line)
+        size += len(line)
+        shown_rows += 1
+
+    omitted = len(lod) - max(shown_rows, 0)
+    if omitted > 0:
+        parts.append(f"... {omitted} more rows omitted\n")
+
+    return "".join(parts)
+
+
+_CODE_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def _value_end(text: str, start: int) -> int:
+    """Index of the bracket closing the value opened at `start`, skipping quoted strings."""
+    depth = 0
+    quote = None
+    escaped = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '{[':
+            depth += 1
+        elif char in '}]':
+            depth -= 1
+            if depth == 0:
+                return i
+    return text.rfind('}' if text[start] == '{' else ']')
+
+
+def repair_json(text: str) -> Any:
+    """
+    Parse a JSON reply locally, fixing common LLM formatting slips.
+
+    Handles code fences, text before or after the JSON value, and
+    Python-style literals (single quotes, True/False/None).
+
+    Raises:
+        ValueError: If the text cannot be repaired into a JSON value.
+    """
+    fenced = _CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise ValueError(f"no JSON value found in: {text!r}")
+    start = min(starts)
+    try:
+        # Stops at the end of the first value, whatever follows it
+        return json.JSONDecoder().raw_decode(text, start)[0]
+    except ValueError:
+        pass
+
+    candidate = text[start:_value_end(text, start) + 1]
+    try:
+        value = ast.literal_eval(candidate)
+        if isinstance(value, (dict, list)):
+            return value
+    except (ValueError, SyntaxError):
+        pass
+    return json.loads(candidate.replace("'", '"'))
+
+
+# HTTP statuses worth retrying: rate limits and transient server errors
+RETRY_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+_TRANSIENT_ERROR_NAMES = ('RateLimit', 'TooManyRequests', 'Timeout', 'Connect', 'ServiceUnavailable')
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether `error` is a rate limit or transport failure that may pass on a later attempt."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status in RETRY_STATUS_CODES:
+        return True
+    return any(part in type(error).__name__ for part in _TRANSIENT_ERROR_NAMES)